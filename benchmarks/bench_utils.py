@@ -0,0 +1,20 @@
+"""Helpers shared by the benchmark scripts: test frames and timing."""
+import time
+
+from PIL import Image
+
+def make_frame(size, source=None):
+    """Scale a real photo to the frame size, or synthesize a frame with some detail"""
+    if source is not None:
+        return source.resize(size, Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    return Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+def time_ms(fn, repeats):
+    """Mean milliseconds per call over `repeats` calls, after one warm-up call"""
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
@@ -0,0 +1,96 @@
+"""
+Per-token decode latency of SmolVLM in eager mode with a dynamic cache versus
+a preallocated static cache with a torch.compile'd text model (the server's
+SMOLVLM_STATIC_CACHE mode).
+
+Decode time per token is measured as the difference between generating
+--tokens tokens and a single token, so prefill and the vision encoder cancel out.
+
+Usage:
+    python benchmarks/decode_benchmark.py [--image photo.jpg] [--tokens 64] [--repeats 3]
+"""
+import argparse
+import time
+
+import torch
+from PIL import Image
+from transformers import AutoModelForVision2Seq, AutoProcessor, StaticCache
+
+def build_inputs(processor, model, image, bucket):
+    messages = [{"role": "user", "content": [{"type": "image"}, {"type": "text", "text": "Describe this image."}]}]
+    prompt = processor.apply_chat_template(messages, add_generation_prompt=True)
+    inputs = processor(text=[prompt], images=[[image]], return_tensors="pt")
+
+    # Same left padding to a bucket multiple as the server's static mode
+    padding = -inputs["input_ids"].shape[1] % bucket
+    if padding:
+        pad_token_id = processor.tokenizer.pad_token_id or processor.tokenizer.eos_token_id
+        inputs["input_ids"] = torch.cat([torch.full((1, padding), pad_token_id), inputs["input_ids"]], dim=1)
+        inputs["attention_mask"] = torch.cat([torch.zeros((1, padding), dtype=torch.long), inputs["attention_mask"]], dim=1)
+    return {k: v.to(model.device) for k, v in inputs.items()}
+
+def time_generate(model, inputs, new_tokens, repeats, make_cache=None):
+    def run():
+        kwargs = {"past_key_values": make_cache()} if make_cache else {}
+        with torch.no_grad():
+            model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens, do_sample=False, **kwargs)
+
+    run()  # Warm up (and compile)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        run()
+    return (time.perf_counter() - start) / repeats
+
+def ms_per_token(model, inputs, tokens, repeats, make_cache=None):
+    full = time_generate(model, inputs, tokens, repeats, make_cache)
+    single = time_generate(model, inputs, 1, repeats, make_cache)
+    return (full - single) / (tokens - 1) * 1000, single * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Image to describe (default: synthetic frame)")
+    parser.add_argument("--model", default="HuggingFaceTB/SmolVLM-Instruct")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--prompt-bucket", type=int, default=64)
+    parser.add_argument("--cache-bucket", type=int, default=256)
+    parser.add_argument("--compile-mode", default="default")
+    args = parser.parse_args()
+
+    processor = AutoProcessor.from_pretrained(args.model)
+    model = AutoModelForVision2Seq.from_pretrained(args.model, torch_dtype=torch.bfloat16, device_map="auto")
+    if args.image:
+        image = Image.open(args.image).convert("RGB")
+    else:
+        image = Image.effect_noise((512, 384), 40).convert("RGB")
+    inputs = build_inputs(processor, model, image, args.prompt_bucket)
+    prompt_length = inputs["input_ids"].shape[1]
+
+    eager, eager_prefill = ms_per_token(model, inputs, args.tokens, args.repeats)
+
+    cache_length = -(-(prompt_length + args.tokens) // args.cache_bucket) * args.cache_bucket
+    cache = StaticCache(
+        config=model.config.text_config,
+        max_batch_size=1,
+        max_cache_len=cache_length,
+        device=model.device,
+        dtype=model.dtype
+    )
+
+    def reset_cache():
+        cache.reset()
+        return cache
+
+    model.generation_config.disable_compile = True
+    text_model = model.model.text_model
+    text_model.forward = torch.compile(text_model.forward, mode=args.compile_mode, dynamic=False)
+    static, static_prefill = ms_per_token(model, inputs, args.tokens, args.repeats, reset_cache)
+
+    print(f"Prompt tokens: {prompt_length}, cache length: {cache_length}, generated tokens: {args.tokens}")
+    print(f"{'mode':>22} {'prefill ms':>11} {'decode ms/token':>16}")
+    print(f"{'eager + dynamic cache':>22} {eager_prefill:>11.1f} {eager:>16.2f}")
+    print(f"{'compiled + static':>22} {static_prefill:>11.1f} {static:>16.2f}")
+    print(f"Decode speedup: {eager / static:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Load test for the serving stack: batching, decode workers, caches and queueing.
+
+By default the server runs in-process on the fake backend (SMOLVLM_BACKEND=fake),
+which loads no model and answers with simulated prefill and per-token latency,
+so the numbers reflect the server rather than the model. Every request sends a
+different frame and the response cache is off, so each one reaches the backend.
+Pass --url to load an already running server instead.
+
+Usage:
+    python benchmarks/load_test.py [--clients 8] [--requests 64] [--token-ms 20]
+    python benchmarks/load_test.py --url http://localhost:8000
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_utils import make_frame  # noqa: E402
+
+def start_local_server(args):
+    """Serve the app on a free local port with the fake backend and return its URL"""
+    os.environ["SMOLVLM_BACKEND"] = "fake"
+    os.environ["SMOLVLM_FAKE_PREFILL_MS"] = str(args.prefill_ms)
+    os.environ["SMOLVLM_FAKE_TOKEN_MS"] = str(args.token_ms)
+    os.environ["SMOLVLM_RESPONSE_CACHE"] = "0"
+    from werkzeug.serving import make_server
+    import server_working
+
+    server_working.model_loader.start()
+    while not server_working.model_loader.ready:
+        if server_working.model_loader.state == "failed":
+            sys.exit(f"Model loading failed: {server_working.model_loader.error}")
+        time.sleep(0.05)
+
+    server = make_server("127.0.0.1", 0, server_working.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def make_payloads(count, size):
+    """JPEG bytes of distinct frames (the synthetic frame's noise differs each call)"""
+    payloads = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        make_frame(size).save(buffer, format="JPEG", quality=85)
+        payloads.append(buffer.getvalue())
+    return payloads
+
+def send(url, payload, max_tokens):
+    """POST one raw JPEG frame; returns (seconds, error or None)"""
+    request = urllib.request.Request(
+        f"{url}/v1/chat/completions?max_tokens={max_tokens}",
+        data=payload,
+        headers={"Content-Type": "image/jpeg"},
+        method="POST"
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            json.load(response)
+        return time.perf_counter() - start, None
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        return time.perf_counter() - start, str(e)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Running server to load (default: in-process server on the fake backend)")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=64, help="Total requests")
+    parser.add_argument("--max-tokens", type=int, default=48)
+    parser.add_argument("--frame-size", type=int, nargs=2, default=(1280, 720), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--prefill-ms", type=float, default=150, help="Fake backend prefill latency")
+    parser.add_argument("--token-ms", type=float, default=20, help="Fake backend per-token latency")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") if args.url else start_local_server(args)
+    payloads = make_payloads(args.requests, tuple(args.frame_size))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        outcomes = list(pool.map(lambda payload: send(url, payload, args.max_tokens), payloads))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds * 1000 for seconds, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+    print(f"{args.requests} requests from {args.clients} clients against {url}")
+    print(f"{'ok':>6} {'errors':>7} {'req/s':>8} {'mean_ms':>9} {'p50_ms':>8} {'p90_ms':>8} {'p99_ms':>8}")
+    if latencies:
+        print(
+            f"{len(latencies):>6} {len(errors):>7} {len(latencies) / elapsed:>8.2f} "
+            f"{sum(latencies) / len(latencies):>9.1f} {percentile(latencies, 0.5):>8.1f} "
+            f"{percentile(latencies, 0.9):>8.1f} {percentile(latencies, 0.99):>8.1f}"
+        )
+    else:
+        print(f"{0:>6} {len(errors):>7}")
+    if errors:
+        print(f"First error: {errors[0]}")
+
+    with urllib.request.urlopen(f"{url}/stats", timeout=10) as response:
+        server_stats = json.load(response)
+    print()
+    utilization = ", ".join(
+        f"{stage} {stage_stats['utilization_percent']}%" for stage, stage_stats in server_stats["stage_utilization"].items()
+    )
+    print(f"Server: average batch size {server_stats['average_batch_size']}; stage utilization: {utilization}")
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+    main()
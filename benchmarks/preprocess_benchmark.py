@@ -0,0 +1,56 @@
+"""
+Micro-benchmark for the vectorized preprocessing path in fast_preprocessing.
+
+Times the generic HF processor against FastSmolVLMPreprocessor on typical
+resized camera frames and checks that both produce the same tensors.
+Only the processor is loaded, not the model.
+
+Usage:
+    python benchmarks/preprocess_benchmark.py [--image photo.jpg] [--repeats 10]
+"""
+import argparse
+import os
+import sys
+
+from PIL import Image
+from transformers import AutoProcessor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_utils import make_frame, time_ms  # noqa: E402
+from fast_preprocessing import FastSmolVLMPreprocessor  # noqa: E402
+
+FRAME_SIZES = [(512, 384), (384, 512), (512, 288), (256, 256)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Photo to scale to each frame size (default: synthetic frame)")
+    parser.add_argument("--model", default="HuggingFaceTB/SmolVLM-Instruct")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    processor = AutoProcessor.from_pretrained(args.model)
+    fast = FastSmolVLMPreprocessor(processor)
+    source = Image.open(args.image).convert("RGB") if args.image else None
+    prompt = processor.apply_chat_template(
+        [{"role": "user", "content": [{"type": "image"}, {"type": "text", "text": "Describe this image."}]}],
+        add_generation_prompt=True
+    )
+
+    frames = [make_frame(size, source) for size in FRAME_SIZES]
+    report = fast.verify(processor, images=frames, prompt=prompt)
+    print(f"Output matches HF processor: {report['ok']} (verified settings: {sorted(fast.verified_settings)})")
+    defaults = [
+        check for check in report["checks"]
+        if (check["do_image_splitting"], check["longest_edge"]) == (fast.do_image_splitting, fast.longest_edge)
+    ]
+
+    print(f"Preprocess one frame (ms, {args.repeats} repeats)")
+    print(f"{'size':>10} {'hf':>9} {'fast':>9} {'speedup':>8} {'max_diff':>10}")
+    for frame, result in zip(frames, defaults):
+        hf = time_ms(lambda: processor(text=[prompt], images=[[frame]], return_tensors="pt"), args.repeats)
+        vectorized = time_ms(lambda: fast(text=[prompt], images=[[frame]]), args.repeats)
+        size = f"{frame.size[0]}x{frame.size[1]}"
+        print(f"{size:>10} {hf:>9.2f} {vectorized:>9.2f} {hf / vectorized:>7.1f}x {result['pixel_values_max_abs_diff']:>10.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Accuracy check for the instruction-first prompt order used by the prefix cache
+(SMOLVLM_PREFIX_CACHE).
+
+SmolVLM was trained with the image before the instruction. With the prefix cache
+on, the server places its default accessibility prompt before the image so the
+instruction tokens can be reused. This runs the fixed image set through both
+orders with greedy decoding and reports word-level similarity of the answers.
+Exits non-zero when the mean similarity drops below --min-similarity.
+
+Usage:
+    python benchmarks/prompt_order_check.py [--tokens 128]
+"""
+import argparse
+import difflib
+import glob
+import os
+import sys
+
+import torch
+from PIL import Image
+from transformers import AutoModelForVision2Seq, AutoProcessor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_pipeline import resize_image_for_accessibility  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ACCESSIBILITY_PROMPT = "Describe this image in detail for a blind person. Include people, objects, colors, text, lighting, and any safety considerations. Be specific and comprehensive."
+
+def answer(model, processor, image, prompt, tokens, instruction_first):
+    content = [{"type": "image"}, {"type": "text", "text": prompt}]
+    if instruction_first:
+        content.reverse()
+    text = processor.apply_chat_template([{"role": "user", "content": content}], add_generation_prompt=True)
+    inputs = processor(text=[text], images=[[image]], return_tensors="pt").to(model.device)
+    with torch.no_grad():
+        generated_ids = model.generate(**inputs, max_new_tokens=tokens, do_sample=False)
+    new_tokens = generated_ids[0][inputs["input_ids"].shape[1]:]
+    return processor.decode(new_tokens, skip_special_tokens=True).strip()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="HuggingFaceTB/SmolVLM-Instruct")
+    parser.add_argument("--images", nargs="*", help="Image set (default: the images in public/)")
+    parser.add_argument("--prompt", default=DEFAULT_ACCESSIBILITY_PROMPT)
+    parser.add_argument("--tokens", type=int, default=128)
+    parser.add_argument("--min-similarity", type=float, default=0.6)
+    args = parser.parse_args()
+
+    paths = args.images or sorted(glob.glob(os.path.join(ROOT, "public", "*.jpg")))
+    processor = AutoProcessor.from_pretrained(args.model)
+    model = AutoModelForVision2Seq.from_pretrained(args.model, torch_dtype=torch.bfloat16, device_map="auto")
+
+    similarities = []
+    print(f"{'image':>14} {'similarity':>11}  instruction-first answer")
+    for path in paths:
+        image = resize_image_for_accessibility(Image.open(path).convert("RGB"))
+        expected = answer(model, processor, image, args.prompt, args.tokens, instruction_first=False)
+        actual = answer(model, processor, image, args.prompt, args.tokens, instruction_first=True)
+        similarity = difflib.SequenceMatcher(None, expected.split(), actual.split()).ratio()
+        similarities.append(similarity)
+        print(f"{os.path.basename(path):>14} {similarity:>11.2f}  {actual[:80]}")
+
+    mean_similarity = sum(similarities) / len(similarities)
+    print()
+    print(f"Mean answer similarity to image-first order: {mean_similarity:.3f} (minimum {args.min_similarity})")
+    sys.exit(0 if mean_similarity >= args.min_similarity else 1)
+
+if __name__ == "__main__":
+    main()
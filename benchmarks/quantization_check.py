@@ -0,0 +1,94 @@
+"""
+Accuracy and speed check for the quantized language model (SMOLVLM_QUANTIZATION).
+
+Runs the same fixed image set and prompts through the float32 model and the
+quantized one with greedy decoding, then reports word-level similarity of the
+answers, latency and weight memory. Exits non-zero when the mean similarity
+drops below --min-similarity.
+
+Usage:
+    python benchmarks/quantization_check.py [--mode int8] [--tokens 64]
+"""
+import argparse
+import difflib
+import glob
+import os
+import sys
+import time
+
+import torch
+from PIL import Image
+from transformers import AutoModelForVision2Seq, AutoProcessor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_pipeline import resize_image_for_accessibility  # noqa: E402
+from quantization import QUANTIZATION_MODES, model_nbytes, quantize_language_model  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPTS = [
+    "Describe this image in detail for a blind person.",
+    "Read any text visible in this image.",
+    "Is the path ahead clear? Describe obstacles for navigation.",
+]
+
+def load_model(model_name):
+    return AutoModelForVision2Seq.from_pretrained(model_name, torch_dtype=torch.float32, device_map="cpu")
+
+def answer(model, processor, image, prompt, tokens):
+    messages = [{"role": "user", "content": [{"type": "image"}, {"type": "text", "text": prompt}]}]
+    text = processor.apply_chat_template(messages, add_generation_prompt=True)
+    inputs = processor(text=[text], images=[[image]], return_tensors="pt")
+    start = time.perf_counter()
+    with torch.no_grad():
+        generated_ids = model.generate(**inputs, max_new_tokens=tokens, do_sample=False)
+    elapsed = time.perf_counter() - start
+    new_tokens = generated_ids[0][inputs["input_ids"].shape[1]:]
+    return processor.decode(new_tokens, skip_special_tokens=True).strip(), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="int8", choices=[m for m in QUANTIZATION_MODES if m != "none"])
+    parser.add_argument("--model", default="HuggingFaceTB/SmolVLM-Instruct")
+    parser.add_argument("--images", nargs="*", help="Image set (default: the images in public/)")
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--min-similarity", type=float, default=0.8)
+    args = parser.parse_args()
+
+    paths = args.images or sorted(glob.glob(os.path.join(ROOT, "public", "*.jpg")))
+    images = [resize_image_for_accessibility(Image.open(path).convert("RGB")) for path in paths]
+    processor = AutoProcessor.from_pretrained(args.model)
+
+    reference = load_model(args.model)
+    reference_answers = [
+        answer(reference, processor, image, prompt, args.tokens) for image in images for prompt in PROMPTS
+    ]
+    reference_bytes = model_nbytes(reference)
+    del reference
+
+    quantized = load_model(args.model)
+    applied = quantize_language_model(quantized, args.mode)
+    quantized_answers = [
+        answer(quantized, processor, image, prompt, args.tokens) for image in images for prompt in PROMPTS
+    ]
+    quantized_bytes = model_nbytes(quantized)
+
+    similarities = []
+    cases = [(os.path.basename(path), prompt) for path in paths for prompt in PROMPTS]
+    print(f"{'image':>14} {'prompt':>40} {'similarity':>11} {'fp32 s':>7} {applied + ' s':>7}")
+    for (name, prompt), (expected, reference_time), (actual, quantized_time) in zip(cases, reference_answers, quantized_answers):
+        similarity = difflib.SequenceMatcher(None, expected.split(), actual.split()).ratio()
+        similarities.append(similarity)
+        print(f"{name:>14} {prompt[:40]:>40} {similarity:>11.2f} {reference_time:>7.2f} {quantized_time:>7.2f}")
+
+    mean_similarity = sum(similarities) / len(similarities)
+    reference_latency = sum(t for _, t in reference_answers) / len(reference_answers)
+    quantized_latency = sum(t for _, t in quantized_answers) / len(quantized_answers)
+    print()
+    print(f"Mean answer similarity: {mean_similarity:.3f} (minimum {args.min_similarity})")
+    print(f"Mean latency: fp32 {reference_latency:.2f}s, {applied} {quantized_latency:.2f}s")
+    print(f"Weights: fp32 {reference_bytes / 1024 ** 2:.0f} MB, {applied} {quantized_bytes / 1024 ** 2:.0f} MB")
+
+    sys.exit(0 if mean_similarity >= args.min_similarity else 1)
+
+if __name__ == "__main__":
+    main()
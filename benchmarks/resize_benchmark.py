@@ -0,0 +1,67 @@
+"""
+Micro-benchmark for the image decode and resize strategies in image_pipeline.
+
+Compares single-pass vs two-stage resizing for each resampling filter, and full
+vs draft-mode JPEG decoding, on typical camera frame sizes.
+
+Usage:
+    python benchmarks/resize_benchmark.py [--image photo.jpg] [--repeats 20]
+"""
+import argparse
+import io
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_utils import make_frame, time_ms  # noqa: E402
+from image_pipeline import decode_image, resize_image_for_accessibility  # noqa: E402
+
+CAMERA_SIZES = [(640, 480), (1280, 720), (1920, 1080), (4032, 3024)]
+FILTERS = [
+    Image.Resampling.LANCZOS,
+    Image.Resampling.BICUBIC,
+    Image.Resampling.BILINEAR,
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Photo to scale to each camera size (default: synthetic frame)")
+    parser.add_argument("--max-size", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    source = Image.open(args.image).convert("RGB") if args.image else None
+
+    print(f"Resize to {args.max_size}px (ms per image, {args.repeats} repeats)")
+    print(f"{'size':>12} {'filter':>9} {'single':>9} {'two_stage':>10} {'speedup':>8}")
+    for size in CAMERA_SIZES:
+        frame = make_frame(size, source)
+        for resample in FILTERS:
+            single = time_ms(lambda: resize_image_for_accessibility(frame, args.max_size, resample, two_stage=False), args.repeats)
+            two_stage = time_ms(lambda: resize_image_for_accessibility(frame, args.max_size, resample, two_stage=True), args.repeats)
+            print(f"{size[0]:>6}x{size[1]:<5} {resample.name.lower():>9} {single:>9.2f} {two_stage:>10.2f} {single / two_stage:>7.1f}x")
+
+    print()
+    print(f"JPEG decode + resize to {args.max_size}px (ms per image)")
+    print(f"{'size':>12} {'full':>9} {'draft':>9} {'speedup':>8}")
+    for size in CAMERA_SIZES:
+        buffer = io.BytesIO()
+        make_frame(size, source).save(buffer, format="JPEG", quality=90)
+        payload = buffer.getvalue()
+
+        def full_decode():
+            image = Image.open(io.BytesIO(payload)).convert("RGB")
+            return resize_image_for_accessibility(image, args.max_size)
+
+        def draft_decode():
+            image = decode_image(io.BytesIO(payload), args.max_size)
+            return resize_image_for_accessibility(image, args.max_size)
+
+        full = time_ms(full_decode, args.repeats)
+        draft = time_ms(draft_decode, args.repeats)
+        print(f"{size[0]:>6}x{size[1]:<5} {full:>9.2f} {draft:>9.2f} {full / draft:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Vectorized replacement for the SmolVLM (Idefics3) processor call.
+Builds input_ids, pixel_values and pixel_attention_mask directly, without the
+generic HF image-processor machinery, and can verify itself against it.
+"""
+from PIL import Image
+import math
+
+import numpy as np
+import torch
+
+def _token_text(token):
+    return getattr(token, "content", token)
+
+class FastSmolVLMPreprocessor:
+    """
+    Reproduces the Idefics3 image processor (resize to the longest edge, resize to
+    a multiple of the tile size, tile split plus global image, rescale, normalize,
+    pad) with the same PIL resizes but a single reshape for tile splitting and one
+    batched numpy pass for normalization, then expands the image tokens in the
+    prompt exactly like the processor does.
+    """
+
+    def __init__(self, processor):
+        image_processor = processor.image_processor
+        self.tokenizer = processor.tokenizer
+        self.resample = Image.Resampling(int(image_processor.resample))
+        self.longest_edge = image_processor.size["longest_edge"]
+        self.tile_size = image_processor.max_image_size["longest_edge"]
+        self.do_image_splitting = image_processor.do_image_splitting
+        self.rescale_factor = image_processor.rescale_factor
+        self.mean = np.array(image_processor.image_mean, dtype=np.float32).reshape(1, 3, 1, 1)
+        self.std = np.array(image_processor.image_std, dtype=np.float32).reshape(1, 3, 1, 1)
+
+        self.image_seq_len = processor.image_seq_len
+        self.image_token = _token_text(processor.image_token)
+        self.fake_image_token = _token_text(processor.fake_image_token)
+        self.global_image_token = getattr(processor, "global_image_tag", "<global-img>")
+        self.verified_settings = set()
+
+    def _resize_to_longest_edge(self, image, longest_edge):
+        """Scale so the longest edge equals longest_edge, keeping the short edge even"""
+        width, height = image.size
+        aspect_ratio = width / height
+        if width >= height:
+            width = longest_edge
+            height = int(width / aspect_ratio)
+            if height % 2 != 0:
+                height += 1
+        else:
+            height = longest_edge
+            width = int(height * aspect_ratio)
+            if width % 2 != 0:
+                width += 1
+        return image.resize((max(width, 1), max(height, 1)), self.resample)
+
+    def _resize_to_tile_multiple(self, image):
+        """Round both edges up to a multiple of the vision encoder tile size"""
+        width, height = image.size
+        aspect_ratio = width / height
+        tile = self.tile_size
+        if width >= height:
+            width = math.ceil(width / tile) * tile
+            height = math.ceil(int(width / aspect_ratio) / tile) * tile
+        else:
+            height = math.ceil(height / tile) * tile
+            width = math.ceil(int(height * aspect_ratio) / tile) * tile
+        return image.resize((width, height), self.resample)
+
+    def _tiles(self, image, do_image_splitting, longest_edge):
+        """Return (uint8 tiles [n, tile, tile, 3], rows, cols) for one image"""
+        tile = self.tile_size
+        image = self._resize_to_longest_edge(image.convert("RGB"), longest_edge)
+
+        if not do_image_splitting:
+            square = image.resize((tile, tile), self.resample)
+            return np.asarray(square)[None], 0, 0
+
+        image = self._resize_to_tile_multiple(image)
+        width, height = image.size
+        if width <= tile and height <= tile:
+            return np.asarray(image)[None], 0, 0
+
+        rows, cols = height // tile, width // tile
+        array = np.asarray(image)
+        tiles = array.reshape(rows, tile, cols, tile, 3).transpose(0, 2, 1, 3, 4).reshape(rows * cols, tile, tile, 3)
+        global_image = np.asarray(image.resize((tile, tile), self.resample))
+        return np.concatenate([tiles, global_image[None]]), rows, cols
+
+    def _image_prompt(self, rows, cols):
+        image_tokens = self.image_token * self.image_seq_len
+        if rows == 0 and cols == 0:
+            return f"{self.fake_image_token}{self.global_image_token}{image_tokens}{self.fake_image_token}"
+
+        text = ""
+        for row in range(rows):
+            for col in range(cols):
+                text += f"{self.fake_image_token}<row_{row + 1}_col_{col + 1}>{image_tokens}"
+            text += "\n"
+        text += f"\n{self.fake_image_token}{self.global_image_token}{image_tokens}{self.fake_image_token}"
+        return text
+
+    def __call__(self, text, images, padding=False, return_tensors="pt", do_image_splitting=None, longest_edge=None):
+        """Same inputs and outputs as processor(text=[...], images=[[image], ...], return_tensors="pt")"""
+        if do_image_splitting is None:
+            do_image_splitting = self.do_image_splitting
+        longest_edge = longest_edge or self.longest_edge
+
+        sample_tiles = []
+        prompt_strings = []
+        for prompt, sample_images in zip(text, images):
+            parts = prompt.split(self.image_token)
+            expanded = parts[0]
+            tiles_for_sample = []
+            for index, image in enumerate(sample_images):
+                tiles, rows, cols = self._tiles(image, do_image_splitting, longest_edge)
+                tiles_for_sample.append(tiles)
+                expanded += self._image_prompt(rows, cols) + parts[index + 1]
+            sample_tiles.append(np.concatenate(tiles_for_sample))
+            prompt_strings.append(expanded)
+
+        # Pad every sample to the same tile count; padding tiles stay zero and are masked out
+        tile = self.tile_size
+        max_tiles = max(len(tiles) for tiles in sample_tiles)
+        pixel_values = np.zeros((len(sample_tiles), max_tiles, 3, tile, tile), dtype=np.float32)
+        pixel_attention_mask = np.zeros((len(sample_tiles), max_tiles, tile, tile), dtype=np.int64)
+        for index, tiles in enumerate(sample_tiles):
+            # Same arithmetic as the HF rescale (float64) and normalize (float32) steps
+            normalized = (tiles.transpose(0, 3, 1, 2).astype(np.float64) * self.rescale_factor).astype(np.float32)
+            pixel_values[index, :len(tiles)] = (normalized - self.mean) / self.std
+            pixel_attention_mask[index, :len(tiles)] = 1
+
+        inputs = dict(self.tokenizer(prompt_strings, padding=padding, return_tensors=return_tensors))
+        inputs["pixel_values"] = torch.from_numpy(pixel_values)
+        inputs["pixel_attention_mask"] = torch.from_numpy(pixel_attention_mask)
+        return inputs
+
+    def _settings_key(self, do_image_splitting=None, longest_edge=None):
+        if do_image_splitting is None:
+            do_image_splitting = self.do_image_splitting
+        return bool(do_image_splitting), longest_edge or self.longest_edge
+
+    def supports(self, do_image_splitting=None, longest_edge=None):
+        """Whether verify() confirmed these image settings match the HF processor"""
+        return self._settings_key(do_image_splitting, longest_edge) in self.verified_settings
+
+    def verify(self, processor, images=None, prompt=None, atol=1e-5, settings=None):
+        """
+        Compare against the HF processor on a few images under each
+        (do_image_splitting, longest_edge) setting and report the largest differences.
+        Settings where every image matches are added to verified_settings. By default
+        both splitting modes are checked at each tile multiple up to the default
+        longest edge, which covers every setting the server requests.
+        """
+        if images is None:
+            gradient = Image.linear_gradient("L")
+            images = [
+                Image.merge("RGB", (gradient, gradient.rotate(90), gradient.rotate(180))).resize((512, 384)),
+                Image.effect_noise((288, 512), 64).convert("RGB"),
+            ]
+        if prompt is None:
+            prompt = processor.apply_chat_template(
+                [{"role": "user", "content": [{"type": "image"}, {"type": "text", "text": "Describe this image."}]}],
+                add_generation_prompt=True
+            )
+
+        if settings is None:
+            edges = sorted(set(range(self.tile_size, self.longest_edge + 1, self.tile_size)) | {self.longest_edge})
+            settings = [(splitting, edge) for splitting in (True, False) for edge in edges]
+
+        report = {"ok": True, "checks": []}
+        for do_image_splitting, longest_edge in settings:
+            do_image_splitting, longest_edge = self._settings_key(do_image_splitting, longest_edge)
+            settings_ok = True
+            for image in images:
+                check = self._compare(processor, image, prompt, do_image_splitting, longest_edge, atol)
+                settings_ok = settings_ok and check["ok"]
+                report["checks"].append(check)
+            if settings_ok:
+                self.verified_settings.add((do_image_splitting, longest_edge))
+            report["ok"] = report["ok"] and settings_ok
+
+        return report
+
+    def _compare(self, processor, image, prompt, do_image_splitting, longest_edge, atol):
+        reference = processor(
+            text=[prompt],
+            images=[[image]],
+            return_tensors="pt",
+            do_image_splitting=do_image_splitting,
+            size={"longest_edge": longest_edge}
+        )
+        fast = self(text=[prompt], images=[[image]], do_image_splitting=do_image_splitting, longest_edge=longest_edge)
+
+        shapes_match = reference["pixel_values"].shape == fast["pixel_values"].shape
+        input_ids_match = torch.equal(reference["input_ids"], fast["input_ids"])
+        max_abs_diff = (
+            float((reference["pixel_values"].float() - fast["pixel_values"]).abs().max())
+            if shapes_match else float("inf")
+        )
+        masks_match = shapes_match and torch.equal(
+            reference["pixel_attention_mask"].long(), fast["pixel_attention_mask"]
+        )
+
+        return {
+            "size": image.size,
+            "do_image_splitting": do_image_splitting,
+            "longest_edge": longest_edge,
+            "ok": shapes_match and input_ids_match and masks_match and max_abs_diff <= atol,
+            "input_ids_match": input_ids_match,
+            "pixel_shapes_match": shapes_match,
+            "pixel_masks_match": masks_match,
+            "pixel_values_max_abs_diff": max_abs_diff
+        }
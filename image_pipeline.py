@@ -0,0 +1,88 @@
+"""
+Image decoding and resizing for the SmolVLM server.
+Kept free of model imports so it can be used from benchmarks and worker processes.
+"""
+from PIL import Image
+import base64
+import io
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Resampling filter per prompt type: sharp filters where fine detail matters, cheaper ones for coarse views
+RESIZE_FILTERS = {
+    "text_reading": Image.Resampling.LANCZOS,
+    "accessibility": Image.Resampling.LANCZOS,
+    "general": Image.Resampling.BICUBIC,
+    "safety": Image.Resampling.BILINEAR,
+    "navigation": Image.Resampling.BILINEAR,
+}
+
+# The box pre-reduction stops this many times above the target so the final filter still has work to do
+REDUCING_GAP = 2
+
+def resize_filter_for(prompt_type):
+    return RESIZE_FILTERS.get(prompt_type, Image.Resampling.LANCZOS)
+
+def resize_image_for_accessibility(image, max_size=512, resample=Image.Resampling.LANCZOS, two_stage=True):
+    """
+    Resize image for optimal processing while maintaining quality for accessibility
+    Larger images provide better text recognition and detail detection
+    With two_stage, Pillow first box-downsamples large inputs by an integer factor
+    (reducing_gap) and only the last step uses the (more expensive) resample filter
+    """
+    width, height = image.size
+    
+    # Calculate scaling to maintain aspect ratio
+    if width > height:
+        if width > max_size:
+            height = int(height * max_size / width)
+            width = max_size
+    else:
+        if height > max_size:
+            width = int(width * max_size / height)
+            height = max_size
+    
+    if width != image.size[0] or height != image.size[1]:
+        logger.info(f"Resizing image from {image.size} to ({width}, {height}) for better accessibility processing")
+        image = image.resize((width, height), resample, reducing_gap=REDUCING_GAP if two_stage else None)
+
+    return image
+
+def decode_image(source, max_size=512):
+    """
+    Decode an image file object to RGB.
+    JPEGs are decoded with libjpeg DCT scaling (Image.draft), which decompresses
+    straight to the smallest 1/2, 1/4 or 1/8 scale that is still at least max_size
+    on the longest edge, so a 12 MP photo is never fully decompressed just to be
+    thrown away. The caller finishes with a cheap resize to the exact target.
+    """
+    image = Image.open(source)
+
+    if image.format == "JPEG" and max(image.size) > 2 * max_size:
+        original_size = image.size
+        scale = max_size / max(original_size)
+        requested_size = (max(1, round(original_size[0] * scale)), max(1, round(original_size[1] * scale)))
+        image.draft("RGB", requested_size)
+        logger.info(f"JPEG draft decode from {original_size} to {image.size}")
+
+    return image.convert("RGB")
+
+def decode_and_resize(payload, max_size=512, resample=Image.Resampling.LANCZOS, two_stage=True):
+    """
+    Full decode pipeline for a base64 string, raw bytes or a file object.
+    Module-level so it can run in the server's decode worker pool (threads or
+    processes); returns (image, seconds spent) so the server can report utilization.
+    """
+    start = time.time()
+    if hasattr(payload, "read"):
+        source = payload
+    elif isinstance(payload, str):
+        source = io.BytesIO(base64.b64decode(payload))
+    else:
+        source = io.BytesIO(payload)
+
+    image = decode_image(source, max_size)
+    image = resize_image_for_accessibility(image, max_size, resample, two_stage)
+    return image, time.time() - start
@@ -0,0 +1,988 @@
+"""
+Inference backends for the SmolVLM server.
+A backend turns GenerationRequest-like objects (image, text_prompt,
+generation_params, vision_params) into the result dicts the HTTP layer returns:
+text, prompt_tokens, completion_tokens, generation_time and batch_size.
+Engine-specific imports happen in load(), so selecting one backend never pulls
+in another's dependencies.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Imported by HFSmolVLMBackend.load; the ONNX and fake backends run without it
+torch = None
+
+# model.generate arguments that turn on assisted (speculative) decoding
+SPECULATIVE_KEYS = (
+    "assistant_model", "tokenizer", "assistant_tokenizer", "prompt_lookup_num_tokens", "max_matching_ngram_size"
+)
+
+def vision_settings_key(vision_params):
+    """Hashable form of vision params for batch and cache keys"""
+    if not vision_params:
+        return None
+    return (vision_params["do_image_splitting"], vision_params["longest_edge"])
+
+def image_digest(req):
+    """Content key for a request's image, reusing the payload hash when the image cache computed one"""
+    if req.image_key is not None:
+        return req.image_key
+    return hashlib.blake2b(req.image.tobytes(), digest_size=16).hexdigest() + f"-{req.image.size}"
+
+def left_pad(array, length, axis):
+    """Zero-pad a numpy array at the start of `axis` up to `length`"""
+    padding = [(0, 0)] * array.ndim
+    padding[axis] = (length - array.shape[axis], 0)
+    return np.pad(array, padding)
+
+def select_tokens(logits, generation_params, rng):
+    """Greedy or temperature sampling over [batch, vocab] logits"""
+    temperature = generation_params.get("temperature", 0)
+    if not generation_params.get("do_sample") or temperature <= 0:
+        return logits.argmax(axis=-1)
+
+    scaled = logits.astype(np.float64) / temperature
+    scaled -= scaled.max(axis=-1, keepdims=True)
+    probs = np.exp(scaled)
+    probs /= probs.sum(axis=-1, keepdims=True)
+    return np.array([rng.choice(len(row), p=row) for row in probs])
+
+class InferenceBackend:
+    """
+    Contract between request handling and an inference engine.
+    Subclasses implement load, preprocess, prefill, decode and release (plus
+    decode_text and prompt_lengths); generate and stream drive them with a
+    shared token loop. The state returned by prefill exposes `logits`, the
+    [batch, vocab] scores for the next token, and decode advances it by one token.
+    merge and select combine and split states, which the server's continuous
+    batching engine uses to add and retire sequences between decode steps.
+    """
+
+    name = "base"
+    model_id = None  # Reported by /v1/models and in completion responses
+
+    def __init__(self):
+        self.processor = None
+        self.eos_token_ids = set()
+        self.stage_callback = None
+        self.rng = np.random.default_rng()
+
+    def load(self):
+        """Load weights and sessions; called once before serving"""
+
+    def preprocess(self, requests):
+        """Model inputs for a batch of requests sharing vision params"""
+        raise NotImplementedError
+
+    def prefill(self, inputs):
+        """Run the prompts and return a decode state"""
+        raise NotImplementedError
+
+    def decode(self, state, tokens):
+        """Feed one token per sequence and update state.logits"""
+        raise NotImplementedError
+
+    def release(self, state):
+        """Free per-batch resources such as KV caches"""
+
+    def merge(self, states):
+        """
+        One decode state holding the sequences of `states`, in order. Continuous
+        batching merges each newly prefilled request into the running batch this way.
+        """
+        raise NotImplementedError
+
+    def select(self, state, indices):
+        """Decode state with only the sequences at `indices`, for retiring finished ones"""
+        raise NotImplementedError
+
+    def decode_text(self, token_ids):
+        raise NotImplementedError
+
+    def prompt_lengths(self, inputs):
+        raise NotImplementedError
+
+    def summary(self):
+        """Backend-specific counters merged into /stats"""
+        return {}
+
+    def image_defaults(self):
+        """Tile size, default longest edge and default image splitting of the image processor"""
+        image_processor = self.processor.image_processor
+        return (
+            image_processor.max_image_size["longest_edge"],
+            image_processor.size["longest_edge"],
+            image_processor.do_image_splitting
+        )
+
+    def _record(self, stage, seconds):
+        if self.stage_callback is not None:
+            self.stage_callback(stage, seconds)
+
+    def _preprocess(self, requests):
+        start = time.time()
+        inputs = self.preprocess(requests)
+        self._record("preprocess", time.time() - start)
+        return inputs
+
+    def _iter_tokens(self, requests, inputs):
+        """Yield one list per decode step with each sequence's new token, or None once it finished"""
+        generation_params = requests[0].generation_params
+        budgets = [req.generation_params["max_new_tokens"] for req in requests]
+        counts = [0] * len(requests)
+        finished = [False] * len(requests)
+
+        state = self.prefill(inputs)
+        try:
+            while True:
+                tokens = select_tokens(state.logits, generation_params, self.rng)
+                step = []
+                for index, token in enumerate(tokens.tolist()):
+                    if finished[index]:
+                        step.append(None)
+                        continue
+                    step.append(token)
+                    counts[index] += 1
+                    finished[index] = token in self.eos_token_ids or counts[index] >= budgets[index]
+                yield step
+                if all(finished):
+                    break
+                self.decode(state, tokens)
+        finally:
+            self.release(state)
+
+    def generate(self, requests):
+        """Generate every request in one batch and return one result dict per request, in order"""
+        inputs = self._preprocess(requests)
+        start = time.time()
+        sequences = [[] for _ in requests]
+        for step in self._iter_tokens(requests, inputs):
+            for sequence, token in zip(sequences, step):
+                if token is not None:
+                    sequence.append(token)
+        generation_time = time.time() - start
+        self._record("generate", generation_time)
+
+        return [
+            {
+                "text": self.decode_text(sequence).strip(),
+                "prompt_tokens": int(prompt_tokens),
+                "completion_tokens": len(sequence),
+                "generation_time": generation_time,
+                "batch_size": len(requests)
+            }
+            for sequence, prompt_tokens in zip(sequences, self.prompt_lengths(inputs))
+        ]
+
+    def stream(self, req):
+        """Yield text pieces for one request as they decode; the generator returns the result dict"""
+        inputs = self._preprocess([req])
+        start = time.time()
+        sequence = []
+        text = ""
+        for step in self._iter_tokens([req], inputs):
+            if step[0] is None:
+                continue
+            sequence.append(step[0])
+            decoded = self.decode_text(sequence)
+            # Hold back partial multi-byte characters until the next token completes them
+            if len(decoded) > len(text) and not decoded.endswith("\ufffd"):
+                yield decoded[len(text):]
+                text = decoded
+        generation_time = time.time() - start
+        self._record("generate", generation_time)
+
+        return {
+            "text": self.decode_text(sequence).strip(),
+            "prompt_tokens": int(self.prompt_lengths(inputs)[0]),
+            "completion_tokens": len(sequence),
+            "generation_time": generation_time,
+            "batch_size": 1
+        }
+
+class OnnxDecodeState:
+    """KV cache and position bookkeeping for one ONNX decode batch"""
+
+    def __init__(self, past_key_values, attention_mask, position_ids, logits=None):
+        self.past_key_values = past_key_values
+        self.attention_mask = attention_mask
+        self.position_ids = position_ids
+        self.logits = logits
+
+ONNX_DTYPES = {"tensor(float16)": np.float16, "tensor(float)": np.float32}
+
+class OnnxSmolVLMBackend(InferenceBackend):
+    """
+    SmolVLM exported to ONNX, in the layout published under onnx/ in the SmolVLM
+    model repos: vision_encoder, embed_tokens and decoder_model_merged, run on
+    ONNX Runtime's CPU execution provider. Preprocessing uses the matching HF
+    processor, so images, prompts and vision params behave as in the PyTorch path.
+    """
+
+    name = "onnx"
+    SESSIONS = ("vision_encoder", "embed_tokens", "decoder_model_merged")
+
+    def __init__(self, model_id, onnx_dir=None, variant="", threads=0):
+        super().__init__()
+        self.model_id = model_id
+        self.onnx_dir = onnx_dir
+        self.variant = variant
+        self.threads = threads
+        self.processor = None
+        self.sessions = {}
+
+    def _session_path(self, name):
+        filename = f"{name}_{self.variant}.onnx" if self.variant else f"{name}.onnx"
+        if self.onnx_dir:
+            return os.path.join(self.onnx_dir, filename)
+
+        from huggingface_hub import hf_hub_download
+        from huggingface_hub.utils import EntryNotFoundError
+        path = hf_hub_download(self.model_id, f"onnx/{filename}")
+        try:
+            hf_hub_download(self.model_id, f"onnx/{filename}_data")  # Large graphs keep weights alongside
+        except EntryNotFoundError:
+            pass
+        return path
+
+    def load(self):
+        import onnxruntime
+        from transformers import AutoConfig, AutoProcessor
+
+        self.processor = AutoProcessor.from_pretrained(self.model_id)
+        self.processor.tokenizer.padding_side = "left"
+        model_config = AutoConfig.from_pretrained(self.model_id)
+
+        options = onnxruntime.SessionOptions()
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        for name in self.SESSIONS:
+            self.sessions[name] = onnxruntime.InferenceSession(
+                self._session_path(name), sess_options=options, providers=["CPUExecutionProvider"]
+            )
+
+        text_config = model_config.text_config
+        self.num_layers = text_config.num_hidden_layers
+        self.num_kv_heads = text_config.num_key_value_heads
+        self.head_dim = getattr(text_config, "head_dim", None) or text_config.hidden_size // text_config.num_attention_heads
+        self.image_token_id = model_config.image_token_id
+
+        tokenizer = self.processor.tokenizer
+        self.eos_token_ids = {tokenizer.eos_token_id, tokenizer.convert_tokens_to_ids("<end_of_utterance>")}
+
+        decoder_inputs = {i.name: i.type for i in self.sessions["decoder_model_merged"].get_inputs()}
+        self.kv_dtype = ONNX_DTYPES.get(decoder_inputs["past_key_values.0.key"], np.float32)
+        vision_inputs = {i.name: i.type for i in self.sessions["vision_encoder"].get_inputs()}
+        self.pixel_dtype = ONNX_DTYPES.get(vision_inputs["pixel_values"], np.float32)
+        self.decoder_outputs = [o.name for o in self.sessions["decoder_model_merged"].get_outputs()]
+        logger.info(f"🧩 ONNX Runtime backend loaded: {self.model_id} {self.variant or 'fp32'}")
+
+    def preprocess(self, requests):
+        prompts = [
+            self.processor.apply_chat_template(
+                [{"role": "user", "content": [{"type": "image"}, {"type": "text", "text": req.text_prompt}]}],
+                add_generation_prompt=True
+            )
+            for req in requests
+        ]
+        processor_kwargs = {}
+        vision_params = requests[0].vision_params
+        if vision_params:
+            processor_kwargs = {
+                "do_image_splitting": vision_params["do_image_splitting"],
+                "size": {"longest_edge": vision_params["longest_edge"]}
+            }
+        return self.processor(
+            text=prompts,
+            images=[[req.image] for req in requests],
+            padding=len(prompts) > 1,
+            return_tensors="np",
+            **processor_kwargs
+        )
+
+    def _embed(self, input_ids):
+        return self.sessions["embed_tokens"].run(None, {"input_ids": input_ids})[0]
+
+    def _run_decoder(self, state, inputs_embeds):
+        outputs = self.sessions["decoder_model_merged"].run(None, {
+            "inputs_embeds": inputs_embeds,
+            "attention_mask": state.attention_mask,
+            "position_ids": state.position_ids,
+            **state.past_key_values
+        })
+        outputs = dict(zip(self.decoder_outputs, outputs))
+        state.logits = outputs["logits"][:, -1, :]
+        state.past_key_values = {
+            name: outputs[name.replace("past_key_values", "present")] for name in state.past_key_values
+        }
+
+    def prefill(self, inputs):
+        input_ids = inputs["input_ids"].astype(np.int64)
+        attention_mask = inputs["attention_mask"].astype(np.int64)
+
+        inputs_embeds = self._embed(input_ids)
+        image_features = self.sessions["vision_encoder"].run(["image_features"], {
+            "pixel_values": inputs["pixel_values"].astype(self.pixel_dtype),
+            "pixel_attention_mask": inputs["pixel_attention_mask"].astype(np.bool_)
+        })[0]
+        inputs_embeds[input_ids == self.image_token_id] = image_features.reshape(-1, image_features.shape[-1]).astype(inputs_embeds.dtype)
+
+        # Same positions as the PyTorch model for left-padded batches
+        position_ids = np.cumsum(attention_mask, axis=-1) - 1
+        position_ids[attention_mask == 0] = 1
+
+        batch_size = input_ids.shape[0]
+        past_key_values = {
+            f"past_key_values.{layer}.{kv}": np.zeros([batch_size, self.num_kv_heads, 0, self.head_dim], dtype=self.kv_dtype)
+            for layer in range(self.num_layers)
+            for kv in ("key", "value")
+        }
+        state = OnnxDecodeState(past_key_values, attention_mask, position_ids)
+        self._run_decoder(state, inputs_embeds)
+        return state
+
+    def decode(self, state, tokens):
+        input_ids = np.asarray(tokens, dtype=np.int64).reshape(-1, 1)
+        state.attention_mask = np.concatenate([state.attention_mask, np.ones_like(input_ids)], axis=1)
+        state.position_ids = state.position_ids[:, -1:] + 1
+        self._run_decoder(state, self._embed(input_ids))
+
+    def release(self, state):
+        state.past_key_values = None
+
+    def merge(self, states):
+        # Caches and masks are left-padded to a common length, like a padded prompt batch
+        length = max(state.attention_mask.shape[1] for state in states)
+        return OnnxDecodeState(
+            {
+                name: np.concatenate([left_pad(state.past_key_values[name], length, axis=2) for state in states])
+                for name in states[0].past_key_values
+            },
+            np.concatenate([left_pad(state.attention_mask, length, axis=1) for state in states]),
+            np.concatenate([state.position_ids[:, -1:] for state in states]),
+            np.concatenate([state.logits for state in states])
+        )
+
+    def select(self, state, indices):
+        attention_mask = state.attention_mask[indices]
+        # Drop leading columns that are padding for every remaining sequence
+        start = int(attention_mask.any(axis=0).argmax())
+        return OnnxDecodeState(
+            {name: value[indices][:, :, start:] for name, value in state.past_key_values.items()},
+            attention_mask[:, start:],
+            state.position_ids[indices][:, -1:],
+            state.logits[indices]
+        )
+
+    def decode_text(self, token_ids):
+        return self.processor.decode(token_ids, skip_special_tokens=True)
+
+    def prompt_lengths(self, inputs):
+        return inputs["attention_mask"].sum(axis=1).tolist()
+
+class FakeDecodeState:
+    """Per-sequence seeds, answer lengths and decode steps for FakeBackend"""
+
+    def __init__(self, seeds, lengths, steps=None, logits=None):
+        self.seeds = seeds
+        self.lengths = lengths
+        self.steps = steps if steps is not None else [0] * len(seeds)
+        self.logits = logits
+
+class FakeBackend(InferenceBackend):
+    """
+    Deterministic stand-in for load tests and benchmarks of the serving stack.
+    No model is loaded: each answer is a word sequence derived from a hash of the
+    image and prompt, and prefill and decode sleep for a fixed time, so the same
+    request always yields the same text at a predictable cost.
+    """
+
+    name = "fake"
+    model_id = "fake/SmolVLM-Fake"
+    WORDS = (
+        "a", "the", "person", "door", "table", "chair", "window", "street", "sign", "car",
+        "light", "path", "is", "on", "near", "left", "right", "ahead", "open", "clear"
+    )
+
+    def __init__(self, prefill_ms=0, token_ms=0, max_tokens=48):
+        super().__init__()
+        self.prefill_ms = prefill_ms
+        self.token_ms = token_ms
+        self.max_tokens = max_tokens
+        self.eos_token_id = len(self.WORDS)
+        self.eos_token_ids = {self.eos_token_id}
+
+    def load(self):
+        logger.info(f"🧪 Fake backend: {self.prefill_ms}ms prefill, {self.token_ms}ms per token")
+
+    def image_defaults(self):
+        return 384, 1536, True  # SmolVLM's tile size and default longest edge
+
+    def preprocess(self, requests):
+        seeds = []
+        prompt_tokens = []
+        for req in requests:
+            digest = hashlib.blake2b(req.image.tobytes(), digest_size=8)
+            digest.update(req.text_prompt.encode("utf-8"))
+            seeds.append(int.from_bytes(digest.digest(), "little"))
+            prompt_tokens.append(len(req.text_prompt.split()) + 64)  # Roughly one image's worth of tokens
+        return {"seeds": seeds, "prompt_tokens": prompt_tokens}
+
+    def _update_logits(self, state):
+        logits = np.full((len(state.seeds), len(self.WORDS) + 1), -1e4, dtype=np.float32)
+        for index, (seed, length, step) in enumerate(zip(state.seeds, state.lengths, state.steps)):
+            token = self.eos_token_id if step >= length else (seed * (step + 1) * 2654435761 >> 16) % len(self.WORDS)
+            logits[index, token] = 0.0
+        state.logits = logits
+
+    def prefill(self, inputs):
+        time.sleep(self.prefill_ms / 1000)
+        lengths = [8 + seed % max(self.max_tokens - 8, 1) for seed in inputs["seeds"]]
+        state = FakeDecodeState(inputs["seeds"], lengths)
+        self._update_logits(state)
+        return state
+
+    def decode(self, state, tokens):
+        time.sleep(self.token_ms / 1000)
+        state.steps = [step + 1 for step in state.steps]
+        self._update_logits(state)
+
+    def merge(self, states):
+        return FakeDecodeState(
+            [seed for state in states for seed in state.seeds],
+            [length for state in states for length in state.lengths],
+            [step for state in states for step in state.steps],
+            np.concatenate([state.logits for state in states])
+        )
+
+    def select(self, state, indices):
+        return FakeDecodeState(
+            [state.seeds[i] for i in indices],
+            [state.lengths[i] for i in indices],
+            [state.steps[i] for i in indices],
+            state.logits[indices]
+        )
+
+    def decode_text(self, token_ids):
+        return " ".join(self.WORDS[token] for token in token_ids if token != self.eos_token_id)
+
+    def prompt_lengths(self, inputs):
+        return inputs["prompt_tokens"]
+
+def cache_to_legacy(past_key_values):
+    """Convert a transformers cache object into a tuple of (key, value) tensors per layer"""
+    if isinstance(past_key_values, tuple):
+        return past_key_values
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return tuple((layer.keys, layer.values) for layer in past_key_values.layers)
+
+def cache_from_legacy(legacy_cache):
+    """Wrap per-layer (key, value) tensors back into a DynamicCache the model can extend"""
+    from transformers import DynamicCache
+
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(legacy_cache)
+    return DynamicCache(legacy_cache)
+
+def left_pad_cache(legacy_cache, attention_mask, length):
+    """Left-pad a cache and its attention mask along the sequence axis to the given length"""
+    pad = length - attention_mask.shape[1]
+    if pad <= 0:
+        return legacy_cache, attention_mask
+
+    padded_cache = tuple(
+        (torch.nn.functional.pad(key, (0, 0, pad, 0)), torch.nn.functional.pad(value, (0, 0, pad, 0)))
+        for key, value in legacy_cache
+    )
+    return padded_cache, torch.nn.functional.pad(attention_mask, (pad, 0))
+
+class HFDecodeState:
+    """DynamicCache, attention mask and next position ids for one PyTorch decode batch"""
+
+    def __init__(self, past_key_values, attention_mask, position_ids, logits=None):
+        self.past_key_values = past_key_values
+        self.attention_mask = attention_mask
+        self.position_ids = position_ids
+        self.logits = logits
+
+class HFSmolVLMBackend(InferenceBackend):
+    """
+    The PyTorch transformers path, and the default backend. The caches built on
+    the model's internals are passed in by the server: image_cache (decoded
+    images and processor outputs), vision_cache (vision-encoder outputs),
+    prefix_cache (KV of prompt prefixes placed before the image) and
+    static_cache_pool (static KV caches for a compiled text model). load drops
+    the ones this transformers version cannot support. The server sets
+    fast_preprocessor once it has been verified against the processor.
+
+    prefill and decode step a DynamicCache and serve continuous batching.
+    generate and stream run model.generate instead, which is where the static
+    cache and speculative decoding plug in.
+    """
+
+    name = "hf"
+
+    def __init__(self, model_id, quantization="none", image_cache=None, vision_cache=None, prefix_cache=None,
+                 prefix_cached_prompts=(), static_cache_pool=None, prompt_bucket=64, compile_mode="default"):
+        super().__init__()
+        self.model_id = model_id
+        self.quantization = quantization
+        self.image_cache = image_cache
+        self.vision_cache = vision_cache
+        self.prefix_cache = prefix_cache
+        self.prefix_cached_prompts = set(prefix_cached_prompts)
+        self.static_cache_pool = static_cache_pool
+        self.prompt_bucket = prompt_bucket
+        self.compile_mode = compile_mode
+        self.fast_preprocessor = None
+        self.model = None
+        self.speculative_generations = 0
+        # Tokens that start the expanded image block; everything before them is a reusable prefix
+        self.image_boundary_token_ids = []
+
+    def load(self):
+        global torch
+        import torch
+        from transformers import AutoModelForVision2Seq, AutoProcessor
+
+        self.processor = AutoProcessor.from_pretrained(self.model_id)
+        if self.quantization == "none":
+            self.model = AutoModelForVision2Seq.from_pretrained(
+                self.model_id,
+                torch_dtype=torch.bfloat16,
+                device_map="auto"
+            )
+        else:
+            # Quantized kernels run on CPU; the vision encoder stays in float32
+            from quantization import quantize_language_model
+            self.model = AutoModelForVision2Seq.from_pretrained(
+                self.model_id,
+                torch_dtype=torch.float32,
+                device_map="cpu"
+            )
+            self.quantization = quantize_language_model(self.model, self.quantization)
+            logger.info(f"🗜️ Language model quantized to {self.quantization}")
+        # Left padding keeps the generated tokens aligned at the end of batched prompts
+        self.processor.tokenizer.padding_side = "left"
+        self.eos_token_ids = {self.processor.tokenizer.eos_token_id}
+
+        self._init_vision_cache()
+        self._init_prefix_cache()
+        self._init_static_cache()
+
+    def _init_vision_cache(self):
+        if self.vision_cache is not None and not hasattr(self.model.model, "get_image_features"):
+            self.vision_cache = None
+            logger.warning("⚠️ Vision feature cache disabled: this transformers version does not expose get_image_features")
+
+    def _init_prefix_cache(self):
+        if self.prefix_cache is None:
+            return
+        if not (hasattr(self.model.model, "get_image_features") and hasattr(self.model.model, "inputs_merger")):
+            self.prefix_cache = None
+            logger.warning("⚠️ Prefix KV cache disabled: this transformers version does not expose the image merge helpers")
+            return
+        self.image_boundary_token_ids = [
+            token_id for token_id in (
+                self.processor.tokenizer.convert_tokens_to_ids("<fake_token_around_image>"),
+                getattr(self.model.config, "image_token_id", None)
+            ) if token_id is not None
+        ]
+        logger.info("🧠 Prefix KV cache enabled (instruction text is placed before the image)")
+
+    def _init_static_cache(self):
+        if self.static_cache_pool is None:
+            return
+        text_model = getattr(self.model.model, "text_model", None)
+        if text_model is None:
+            self.static_cache_pool = None
+            logger.warning("⚠️ Static cache mode disabled: this transformers version does not expose the text model")
+            return
+        # Only the language model is compiled; the vision encoder runs once per image and stays eager
+        if self.compile_mode != "none":
+            text_model.forward = torch.compile(text_model.forward, mode=self.compile_mode, dynamic=False)
+        self.model.generation_config.disable_compile = True
+        logger.info(f"🧊 Static KV cache enabled (cache bucket {self.static_cache_pool.bucket}, compile mode {self.compile_mode})")
+
+    def _processor_inputs(self, requests):
+        """
+        Apply the SmolVLM chat template and run the processor for the requests,
+        padding them into a single batch. The requests' shared vision_params set
+        image splitting and longest-edge size.
+        """
+        prompts = []
+        for req in requests:
+            content = [{"type": "image"}, {"type": "text", "text": req.text_prompt}]
+            if self.prefix_cache is not None and req.text_prompt in self.prefix_cached_prompts:
+                # Instruction first, so the default prompt shares a cacheable token prefix
+                content.reverse()
+            messages_formatted = [{"role": "user", "content": content}]
+            prompts.append(self.processor.apply_chat_template(messages_formatted, add_generation_prompt=True))
+
+        # Single resent frames can reuse processor outputs from the content cache
+        vision_params = requests[0].vision_params
+        image_key = requests[0].image_key if len(requests) == 1 else None
+        inputs_key = (prompts[0], vision_settings_key(vision_params))
+        inputs = None
+        if self.image_cache is not None and image_key is not None:
+            inputs = self.image_cache.get_inputs(image_key, inputs_key)
+
+        if inputs is None:
+            images = [[req.image] for req in requests]
+            if self.fast_preprocessor is not None and self.fast_preprocessor.supports(**(vision_params or {})):
+                inputs = self.fast_preprocessor(
+                    text=prompts,
+                    images=images,
+                    padding=len(prompts) > 1,
+                    **(vision_params or {})
+                )
+            else:
+                processor_kwargs = {}
+                if vision_params:
+                    processor_kwargs = {
+                        "do_image_splitting": vision_params["do_image_splitting"],
+                        "size": {"longest_edge": vision_params["longest_edge"]}
+                    }
+                inputs = self.processor(
+                    text=prompts,
+                    images=images,
+                    padding=len(prompts) > 1,
+                    return_tensors="pt",
+                    **processor_kwargs
+                )
+            if self.image_cache is not None and image_key is not None:
+                self.image_cache.put_inputs(image_key, inputs_key, dict(inputs))
+
+        # Move to device
+        return {k: v.to(self.model.device) for k, v in inputs.items()}
+
+    def _attach_image_features(self, inputs, requests):
+        """
+        Replace pixel inputs with vision-encoder outputs, encoding only images that are
+        not already in the vision feature cache. The model then consumes the features
+        through its image_hidden_states argument.
+        """
+        pixel_attention_mask = inputs.get("pixel_attention_mask")
+        features = []
+
+        for index, req in enumerate(requests):
+            pixel_values = inputs["pixel_values"][index:index + 1]
+            mask = pixel_attention_mask[index:index + 1] if pixel_attention_mask is not None else None
+
+            # Padding tiles are all zeros; the real tile count keeps differently-split images apart
+            real_tiles = int((pixel_values != 0).flatten(2).any(dim=2).sum())
+            key = (image_digest(req), real_tiles, vision_settings_key(req.vision_params))
+
+            image_features = self.vision_cache.get(key)
+            if image_features is None:
+                with torch.no_grad():
+                    image_features = self.model.model.get_image_features(pixel_values=pixel_values, pixel_attention_mask=mask)
+                self.vision_cache.put(key, image_features)
+            else:
+                logger.info("♻️ Reusing cached vision features")
+            features.append(image_features)
+
+        inputs = {k: v for k, v in inputs.items() if k not in ("pixel_values", "pixel_attention_mask")}
+        inputs["image_hidden_states"] = torch.cat(features)
+        return inputs
+
+    def preprocess(self, requests):
+        inputs = self._processor_inputs(requests)
+        if self.vision_cache is not None:
+            inputs = self._attach_image_features(inputs, requests)
+        return inputs
+
+    def prefill_from_prefix(self, inputs, end=None):
+        """
+        Prefill input_ids[:, :end] (a single sequence) reusing the cached KV for the
+        prompt prefix before the first image token. Only the image block and the
+        remaining template tokens are run through the model.
+        Returns the model outputs, or None when there is no reusable prefix.
+        """
+        input_ids = inputs["input_ids"]
+        end = input_ids.shape[1] if end is None else end
+
+        boundary = torch.isin(input_ids[0], torch.tensor(self.image_boundary_token_ids, device=input_ids.device)).nonzero()
+        if len(boundary) == 0:
+            return None
+        prefix_length = int(boundary[0])
+        if prefix_length < 2 or prefix_length >= end:
+            return None
+
+        prefix_ids = input_ids[:, :prefix_length]
+        key = tuple(prefix_ids[0].tolist())
+        prefix = self.prefix_cache.get(key)
+        if prefix is None:
+            with torch.no_grad():
+                outputs = self.model(input_ids=prefix_ids, attention_mask=torch.ones_like(prefix_ids), use_cache=True)
+            prefix = cache_to_legacy(outputs.past_key_values)
+            self.prefix_cache.put(key, prefix)
+
+        # The model extends the cache in place, so each request works on its own copy
+        past_key_values = cache_from_legacy(tuple((k.clone(), v.clone()) for k, v in prefix))
+
+        suffix_ids = input_ids[:, prefix_length:end]
+        with torch.no_grad():
+            if "image_hidden_states" in inputs:
+                image_features = inputs["image_hidden_states"]
+            else:
+                image_features = self.model.model.get_image_features(
+                    pixel_values=inputs["pixel_values"],
+                    pixel_attention_mask=inputs.get("pixel_attention_mask")
+                )
+            inputs_embeds = self.model.get_input_embeddings()(suffix_ids)
+            inputs_embeds = self.model.model.inputs_merger(suffix_ids, inputs_embeds, image_features.to(inputs_embeds.dtype))
+
+            return self.model(
+                inputs_embeds=inputs_embeds,
+                attention_mask=inputs["attention_mask"][:, :end],
+                past_key_values=past_key_values,
+                use_cache=True
+            )
+
+    def prefill(self, inputs):
+        attention_mask = inputs["attention_mask"]
+        # Same positions as model.generate for left-padded batches
+        position_ids = attention_mask.long().cumsum(-1) - 1
+        position_ids.masked_fill_(attention_mask == 0, 1)
+
+        outputs = None
+        if self.prefix_cache is not None and attention_mask.shape[0] == 1:
+            outputs = self.prefill_from_prefix(inputs)
+        if outputs is None:
+            with torch.no_grad():
+                outputs = self.model(**inputs, position_ids=position_ids, use_cache=True)
+        return HFDecodeState(
+            outputs.past_key_values, attention_mask, position_ids[:, -1:], outputs.logits[:, -1, :].float().cpu().numpy()
+        )
+
+    def decode(self, state, tokens):
+        device = state.attention_mask.device
+        input_ids = torch.as_tensor(np.asarray(tokens), dtype=torch.long, device=device).view(-1, 1)
+        state.attention_mask = torch.cat([state.attention_mask, torch.ones_like(input_ids, dtype=state.attention_mask.dtype)], dim=1)
+        state.position_ids = state.position_ids + 1
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=state.attention_mask,
+                position_ids=state.position_ids,
+                past_key_values=state.past_key_values,
+                use_cache=True
+            )
+        state.past_key_values = outputs.past_key_values
+        state.logits = outputs.logits[:, -1, :].float().cpu().numpy()
+
+    def release(self, state):
+        state.past_key_values = None
+
+    def merge(self, states):
+        length = max(state.attention_mask.shape[1] for state in states)
+        caches, masks = [], []
+        for state in states:
+            cache, mask = left_pad_cache(cache_to_legacy(state.past_key_values), state.attention_mask, length)
+            caches.append(cache)
+            masks.append(mask)
+        legacy_cache = tuple(
+            (torch.cat([cache[layer][0] for cache in caches]), torch.cat([cache[layer][1] for cache in caches]))
+            for layer in range(len(caches[0]))
+        )
+        return HFDecodeState(
+            cache_from_legacy(legacy_cache),
+            torch.cat(masks),
+            torch.cat([state.position_ids for state in states]),
+            np.concatenate([state.logits for state in states])
+        )
+
+    def select(self, state, indices):
+        index = torch.tensor(indices, device=state.attention_mask.device)
+        attention_mask = state.attention_mask.index_select(0, index)
+        # Drop leading columns that are padding for every remaining sequence
+        start = int(attention_mask.any(dim=0).nonzero()[0])
+        legacy_cache = tuple(
+            (key.index_select(0, index)[:, :, start:, :], value.index_select(0, index)[:, :, start:, :])
+            for key, value in cache_to_legacy(state.past_key_values)
+        )
+        return HFDecodeState(
+            cache_from_legacy(legacy_cache),
+            attention_mask[:, start:],
+            state.position_ids.index_select(0, index),
+            state.logits[indices]
+        )
+
+    def decode_text(self, token_ids):
+        return self.processor.decode(token_ids, skip_special_tokens=True)
+
+    def prompt_lengths(self, inputs):
+        return inputs["attention_mask"].sum(dim=1).tolist()
+
+    def _pad_prompt_to_bucket(self, inputs, bucket):
+        """Left-pad input_ids and attention_mask to a multiple of `bucket` so prefill shapes repeat"""
+        length = inputs["input_ids"].shape[1]
+        padding = -length % bucket
+        if padding == 0:
+            return inputs
+
+        input_ids = inputs["input_ids"]
+        pad_token_id = self.processor.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = self.processor.tokenizer.eos_token_id
+        pad_ids = torch.full((input_ids.shape[0], padding), pad_token_id, dtype=input_ids.dtype, device=input_ids.device)
+        pad_mask = torch.zeros((input_ids.shape[0], padding), dtype=inputs["attention_mask"].dtype, device=input_ids.device)
+        return {
+            **inputs,
+            "input_ids": torch.cat([pad_ids, input_ids], dim=1),
+            "attention_mask": torch.cat([pad_mask, inputs["attention_mask"]], dim=1)
+        }
+
+    def _generate_args(self, requests, inputs):
+        """
+        Prompt inputs, model.generate kwargs and the shared generation params for a
+        batch: bucketed prompts in static cache mode, assisted decoding only for a
+        single request, and a prefix cache prefill when one applies
+        """
+        # Requests in a batch share sampling settings; decode up to the longest token budget
+        generation_params = dict(requests[0].generation_params)
+        generation_params["max_new_tokens"] = max(req.generation_params["max_new_tokens"] for req in requests)
+
+        # Static shapes: bucketed prompt lengths, and no assisted decoding or prefix cache on top
+        if self.static_cache_pool is not None:
+            inputs = self._pad_prompt_to_bucket(inputs, self.prompt_bucket)
+            for key in SPECULATIVE_KEYS:
+                generation_params.pop(key, None)
+
+        # Assisted generation only supports a batch of one; batched requests decode normally
+        if len(requests) > 1:
+            for key in SPECULATIVE_KEYS:
+                generation_params.pop(key, None)
+        elif any(key in generation_params for key in SPECULATIVE_KEYS):
+            self.speculative_generations += 1
+
+        # A single request can prefill from the shared prefix cache; generate then runs the last token
+        generation_inputs = inputs
+        if self.prefix_cache is not None and self.static_cache_pool is None and len(requests) == 1:
+            outputs = self.prefill_from_prefix(inputs, end=inputs["input_ids"].shape[1] - 1)
+            if outputs is not None:
+                generation_inputs = {
+                    "input_ids": inputs["input_ids"],
+                    "attention_mask": inputs["attention_mask"],
+                    "past_key_values": outputs.past_key_values
+                }
+
+        return inputs, generation_inputs, generation_params
+
+    @contextmanager
+    def _static_cache(self, generation_inputs, generation_params):
+        """Borrow a preallocated static cache for one model.generate call when static cache mode is on"""
+        if self.static_cache_pool is None:
+            yield generation_inputs
+            return
+
+        input_ids = generation_inputs["input_ids"]
+        key, cache = self.static_cache_pool.acquire(
+            self.model, input_ids.shape[0], input_ids.shape[1] + generation_params["max_new_tokens"]
+        )
+        try:
+            yield {**generation_inputs, "past_key_values": cache}
+        finally:
+            self.static_cache_pool.release(key, cache)
+
+    def generate(self, requests):
+        inputs, generation_inputs, generation_params = self._generate_args(requests, self._preprocess(requests))
+        eos_token_id = self.processor.tokenizer.eos_token_id
+
+        logger.info("🤖 Generating response...")
+        generation_start = time.time()
+        with torch.no_grad(), self._static_cache(generation_inputs, generation_params) as generation_inputs:
+            generated_ids = self.model.generate(
+                **generation_inputs,
+                **generation_params,
+                pad_token_id=eos_token_id,
+                eos_token_id=eos_token_id
+            )
+        generation_time = time.time() - generation_start
+        self._record("generate", generation_time)
+        logger.info(f"⚡ Generation time: {generation_time:.2f}s (batch size {len(requests)})")
+
+        # Decode only the new tokens, trimming each sequence to its own budget and first EOS
+        prompt_length = inputs['input_ids'].shape[1]
+        results = []
+        for index, req in enumerate(requests):
+            new_tokens = generated_ids[index][prompt_length:][:req.generation_params["max_new_tokens"]]
+            eos_positions = (new_tokens == eos_token_id).nonzero()
+            if len(eos_positions) > 0:
+                new_tokens = new_tokens[:eos_positions[0].item() + 1]
+            results.append({
+                "text": self.decode_text(new_tokens).strip(),
+                "prompt_tokens": int(inputs['attention_mask'][index].sum()),
+                "completion_tokens": len(new_tokens),
+                "generation_time": generation_time,
+                "batch_size": len(requests)
+            })
+
+        return results
+
+    def stream(self, req):
+        """Run model.generate on a background thread and yield text as the streamer produces it"""
+        from transformers import TextIteratorStreamer
+
+        inputs, generation_inputs, generation_params = self._generate_args([req], self._preprocess([req]))
+        eos_token_id = self.processor.tokenizer.eos_token_id
+        streamer = TextIteratorStreamer(self.processor.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        outcome = {"completion_tokens": 0, "error": None}
+
+        def run():
+            try:
+                with torch.no_grad(), self._static_cache(generation_inputs, generation_params) as cache_inputs:
+                    generated_ids = self.model.generate(
+                        **cache_inputs,
+                        **generation_params,
+                        pad_token_id=eos_token_id,
+                        eos_token_id=eos_token_id,
+                        streamer=streamer
+                    )
+                outcome["completion_tokens"] = generated_ids.shape[1] - cache_inputs["input_ids"].shape[1]
+            except Exception as e:
+                outcome["error"] = e
+                streamer.end()
+
+        generation_start = time.time()
+        worker = threading.Thread(target=run, name="generation-stream", daemon=True)
+        worker.start()
+
+        pieces = []
+        for text in streamer:
+            if text:
+                pieces.append(text)
+                yield text
+        worker.join()
+
+        if outcome["error"] is not None:
+            raise outcome["error"]
+
+        generation_time = time.time() - generation_start
+        self._record("generate", generation_time)
+        logger.info(f"⚡ Streamed generation time: {generation_time:.2f}s")
+        return {
+            "text": "".join(pieces).strip(),
+            "prompt_tokens": int(inputs["attention_mask"][0].sum()),
+            "completion_tokens": outcome["completion_tokens"],
+            "generation_time": generation_time,
+            "batch_size": 1
+        }
+
+    def summary(self):
+        return {
+            "vision_cache": self.vision_cache.summary() if self.vision_cache is not None else None,
+            "prefix_cache": self.prefix_cache.summary() if self.prefix_cache is not None else None,
+            "static_cache": self.static_cache_pool.summary() if self.static_cache_pool is not None else None,
+            "speculative_generations": self.speculative_generations
+        }
@@ -0,0 +1,64 @@
+"""
+Weight quantization of the SmolVLM language model for CPU serving.
+Only the text model's linear layers and the LM head are quantized; the vision
+encoder and connector stay at full precision, since they run once per image
+and are the most sensitive to rounding.
+"""
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "int8", "int4")
+
+def is_language_model_linear(module, name):
+    return isinstance(module, torch.nn.Linear) and (name.startswith("model.text_model.") or name == "lm_head")
+
+def quantize_language_model(model, mode):
+    """
+    Quantize the language model in place: "int8" uses PyTorch dynamic quantization
+    (int8 weights, activations quantized per batch), "int4" uses torchao weight-only
+    int4 when it is installed and falls back to int8 otherwise.
+    Returns the mode that was actually applied.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}")
+    if mode == "none":
+        return "none"
+
+    if mode == "int4":
+        try:
+            from torchao.quantization import quantize_, int4_weight_only
+        except ImportError:
+            logger.warning("⚠️ torchao not installed, using int8 dynamic quantization instead of int4")
+            mode = "int8"
+        else:
+            try:
+                from torchao.dtypes import Int4CPULayout
+                int4_config = int4_weight_only(layout=Int4CPULayout())
+            except ImportError:
+                int4_config = int4_weight_only()
+            # int4 kernels expect bfloat16 activations; the vision tower keeps its own dtype
+            model.model.text_model.to(torch.bfloat16)
+            model.lm_head.to(torch.bfloat16)
+            quantize_(model, int4_config, filter_fn=is_language_model_linear)
+            return "int4"
+
+    qconfig = torch.ao.quantization.default_dynamic_qconfig
+    torch.ao.quantization.quantize_dynamic(
+        model,
+        {"model.text_model": qconfig, "lm_head": qconfig},
+        dtype=torch.qint8,
+        inplace=True
+    )
+    return "int8"
+
+def model_nbytes(model):
+    """Bytes held by the model's weights, counting packed quantized weights"""
+    total = 0
+    for value in model.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
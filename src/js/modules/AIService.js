@@ -88,7 +88,7 @@ export class AIService {
       
       const response = await this.makeRequest('/health', 'GET', null, { timeout: 15000 })
       
-      if (response.status === 'healthy' || response.status === 'ok') {
+      if (response.status === 'ready' || response.status === 'idle' || response.status === 'healthy' || response.status === 'ok') {
         this.isConnected = true
         this.connectionRetries = 0
         this.lastHealthCheck = Date.now()
@@ -200,6 +200,11 @@ export class AIService {
         quick_mode: isQuickMode  // Pass quick mode to server
       }
       
+      // Real-time streams identify themselves so the server only keeps the newest frame
+      if (options.sessionId) {
+        requestBody.session_id = options.sessionId
+      }
+      
       // Track active request
       this.activeRequests.set(requestId, {
         startTime,
@@ -268,6 +273,13 @@ export class AIService {
     } catch (error) {
       const responseTime = Date.now() - startTime
       
+      // A newer frame from the same session replaced this one - not a failure
+      if (error.name === 'SupersededError') {
+        console.log(`⏭️ [${requestId}] Frame superseded by a newer frame`)
+        this.eventBus?.emit('ai:analysis-superseded', { requestId, responseTime })
+        throw error
+      }
+      
       // Determine error type
       const isTimeout = error.name === 'TimeoutError' || error.message.includes('timeout')
       
@@ -392,13 +404,18 @@ export class AIService {
       
       if (!response.ok) {
         let errorText = `HTTP ${response.status}`
+        let errorData = null
         try {
-          const errorData = await response.json()
+          errorData = await response.json()
           errorText = errorData.error || errorText
         } catch {
           errorText = await response.text() || errorText
         }
-        throw new Error(errorText)
+        const requestError = new Error(errorText)
+        if (errorData?.status === 'superseded') {
+          requestError.name = 'SupersededError'
+        }
+        throw requestError
       }
       
       return await response.json()
@@ -440,7 +457,7 @@ export class AIService {
         
         // Don't retry on certain errors
         const noRetryErrors = ['400', '401', '403', '404']
-        const shouldNotRetry = noRetryErrors.some(errType => 
+        const shouldNotRetry = error.name === 'SupersededError' || noRetryErrors.some(errType => 
           error.message.includes(errType)
         )
         
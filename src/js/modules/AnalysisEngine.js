@@ -135,6 +135,7 @@ export class AnalysisEngine {
       this.isRealtimeActive = false
       this.realtimeInterval = null
       this.currentFPS = 0.5 // Start with slower FPS
+      this.sessionId = `session_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`
       
       // Processing queue
       this.processingQueue = []
@@ -322,7 +323,8 @@ export class AnalysisEngine {
             prompt,
             {
               maxTokens: this.config.maxTokens,
-              temperature: this.config.temperature
+              temperature: this.config.temperature,
+              sessionId: isRealtimeRequest ? this.sessionId : undefined
             }
           )
       
@@ -367,6 +369,12 @@ export class AnalysisEngine {
           return analysisResult
       
         } catch (error) {
+          // Server dropped this frame in favour of a newer one from our stream
+          if (error.name === 'SupersededError') {
+            console.log('🔍 Real-time frame superseded by a newer frame')
+            return null
+          }
+      
           console.error('❌ Analysis failed:', error)
       
           // Enhanced error handling
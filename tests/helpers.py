@@ -0,0 +1,46 @@
+"""Shared test setup: the server module on the fake backend, and synthetic frames."""
+import io
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+# The fake backend keeps torch and transformers out of the import and answers without delay
+os.environ.setdefault("SMOLVLM_BACKEND", "fake")
+os.environ.setdefault("SMOLVLM_FAKE_PREFILL_MS", "0")
+os.environ.setdefault("SMOLVLM_FAKE_TOKEN_MS", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import server_working  # noqa: E402
+
+GENERATION_PARAMS = {"max_new_tokens": 64, "temperature": 0.0, "do_sample": False}
+
+def make_frame(box=None, size=(256, 256)):
+    """Gradient frame, optionally with a black box drawn at (x, y, width, height)"""
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    if box is not None:
+        x, y, width, height = box
+        ImageDraw.Draw(image).rectangle((x, y, x + width - 1, y + height - 1), fill=(0, 0, 0))
+    return image
+
+def jpeg_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def load_server():
+    """Load the fake backend once and return a test client for the app"""
+    server_working.model_loader.start()
+    deadline = time.time() + 10
+    while not server_working.model_loader.ready:
+        if server_working.model_loader.state == "failed" or time.time() > deadline:
+            raise RuntimeError(f"model loading failed: {server_working.model_loader.error}")
+        time.sleep(0.01)
+    return server_working.app.test_client()
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("condition not reached")
+        time.sleep(0.01)
@@ -0,0 +1,56 @@
+import time
+import unittest
+
+from helpers import server_working
+from server_working import AdaptiveResolutionController, record_stage
+
+class AdaptiveResolutionControllerTest(unittest.TestCase):
+    def make_controller(self, **kwargs):
+        controller = AdaptiveResolutionController(
+            base_size=512, target_latency=1.0, interval=0, smoothing=1.0, **kwargs
+        )
+        controller.stage_marks = server_working.stage_snapshot()  # Ignore stages recorded by other tests
+        return controller
+
+    def test_slow_stages_shrink_and_fast_stages_restore(self):
+        controller = self.make_controller()
+        record_stage("generate", 2.0)
+        controller.observe()
+        self.assertEqual(controller.scale, 0.875)
+        self.assertEqual(controller.summary()["max_size"]["general"], 448)
+
+        record_stage("generate", 0.1)
+        controller.observe()
+        self.assertEqual(controller.scale, 1.0)
+
+    def test_latency_sums_per_call_stage_averages(self):
+        controller = self.make_controller()
+        record_stage("decode", 0.2)
+        record_stage("generate", 0.3)
+        record_stage("generate", 0.5)
+        controller.observe()
+        self.assertAlmostEqual(controller.latency, 0.6)
+
+    def test_continuous_batching_steps_do_not_dilute_latency(self):
+        controller = self.make_controller()
+        for _ in range(40):
+            record_stage("generate_step", 0.05)
+        record_stage("generate", 2.0)
+        controller.observe()
+        self.assertAlmostEqual(controller.latency, 2.0)
+        self.assertLess(controller.scale, 1.0)
+
+    def test_prompt_floors_hold_at_minimum_scale(self):
+        controller = self.make_controller(min_scale=0.5)
+        controller.scale = 0.5
+        self.assertEqual(controller.resolution_for("text_reading")[0], 448)
+        self.assertEqual(controller.resolution_for("navigation")[0], 256)
+
+    def test_idle_resets_to_full_resolution(self):
+        controller = self.make_controller(idle_reset=5)
+        controller.scale = 0.5
+        controller.last_observed = time.time() - 10
+        self.assertEqual(controller.resolution_for("general"), (512, 1.0))
+
+if __name__ == "__main__":
+    unittest.main()
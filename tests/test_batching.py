@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+
+from helpers import GENERATION_PARAMS, make_frame, server_working
+from server_working import BatchScheduler, GenerationRequest
+
+class BatchSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        patcher = mock.patch.object(server_working, "generate_batch", self.generate_batch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = BatchScheduler(window_ms=200, max_batch_size=4)
+
+    def generate_batch(self, requests):
+        self.batches.append([req.text_prompt for req in requests])
+        if any(req.text_prompt == "fail" for req in requests):
+            raise RuntimeError("generation failed")
+        return [{"text": f"answer to {req.text_prompt}", "batch_size": len(requests)} for req in requests]
+
+    def queue(self, prompt, **params):
+        req = GenerationRequest(make_frame(), prompt, {**GENERATION_PARAMS, **params})
+        self.scheduler.pending.put(req)
+        return req
+
+    def test_requests_in_the_window_share_one_batch(self):
+        requests = [self.queue(f"prompt {index}") for index in range(3)]
+        results = [req.future.result(timeout=2) for req in requests]
+        self.assertEqual(self.batches, [["prompt 0", "prompt 1", "prompt 2"]])
+        self.assertEqual([result["text"] for result in results], [f"answer to prompt {index}" for index in range(3)])
+
+    def test_batch_is_capped_at_max_batch_size(self):
+        requests = [self.queue(f"prompt {index}") for index in range(6)]
+        for req in requests:
+            req.future.result(timeout=2)
+        self.assertEqual([len(batch) for batch in self.batches], [4, 2])
+
+    def test_different_sampling_settings_run_separately(self):
+        greedy = self.queue("greedy")
+        sampled = self.queue("sampled", do_sample=True, temperature=0.7)
+        self.assertEqual(greedy.future.result(timeout=2)["batch_size"], 1)
+        self.assertEqual(sampled.future.result(timeout=2)["batch_size"], 1)
+        self.assertEqual(sorted(self.batches), [["greedy"], ["sampled"]])
+
+    def test_failure_reaches_every_request_in_the_group(self):
+        requests = [self.queue("fail"), self.queue("other")]
+        for req in requests:
+            with self.assertRaisesRegex(RuntimeError, "generation failed"):
+                req.future.result(timeout=2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from helpers import GENERATION_PARAMS, make_frame, server_working
+from inference_backends import FakeBackend
+from server_working import ContinuousBatchingEngine, GenerationRequest
+
+class FailingBackend(FakeBackend):
+    def preprocess(self, requests):
+        if requests[0].text_prompt == "fail":
+            raise RuntimeError("bad image")
+        return super().preprocess(requests)
+
+class ContinuousBatchingEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FailingBackend(token_ms=2)
+        self.engine = ContinuousBatchingEngine(self.backend, max_active_sequences=4)
+
+    def queue(self, box, max_new_tokens, prompt="What is in front of me?"):
+        req = GenerationRequest(make_frame(box), prompt, {**GENERATION_PARAMS, "max_new_tokens": max_new_tokens})
+        self.engine.pending.put(req)
+        return req
+
+    def single(self, req):
+        return self.backend.generate([GenerationRequest(req.image, req.text_prompt, req.generation_params)])[0]
+
+    def test_sequences_match_single_generation(self):
+        requests = [self.queue((index * 30, 20, 20, 20), 12 + index * 9) for index in range(5)]
+        for req in requests:
+            result = req.future.result(timeout=5)
+            expected = self.single(req)
+            self.assertEqual(result["text"], expected["text"])
+            self.assertEqual(result["completion_tokens"], expected["completion_tokens"])
+            self.assertEqual(result["prompt_tokens"], expected["prompt_tokens"])
+
+    def test_short_answer_retires_while_long_one_decodes(self):
+        long = self.queue((10, 10, 20, 20), 40)
+        short = self.queue((120, 10, 20, 20), 3)
+        short_result = short.future.result(timeout=5)
+        self.assertEqual(short_result["completion_tokens"], 3)
+        self.assertEqual(short_result["batch_size"], 2)
+        self.assertFalse(long.future.done())
+        self.assertEqual(long.future.result(timeout=5)["text"], self.single(long)["text"])
+        self.assertEqual(self.engine.active, [])
+        self.assertIsNone(self.engine.state)
+
+    def test_generate_latency_is_recorded_once_per_sequence(self):
+        before = server_working.stage_snapshot()["generate"][0]
+        requests = [self.queue((index * 40, 60, 20, 20), 10) for index in range(3)]
+        for req in requests:
+            req.future.result(timeout=5)
+        self.assertEqual(server_working.stage_snapshot()["generate"][0] - before, 3)
+
+    def test_failed_prefill_only_fails_its_request(self):
+        running = self.queue((10, 10, 20, 20), 20)
+        failing = self.queue((60, 10, 20, 20), 20, prompt="fail")
+        with self.assertRaisesRegex(RuntimeError, "bad image"):
+            failing.future.result(timeout=5)
+        self.assertEqual(running.future.result(timeout=5)["text"], self.single(running)["text"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+
+from helpers import GENERATION_PARAMS, make_frame, server_working
+from server_working import (
+    NO_SIGNIFICANT_CHANGE,
+    DeltaDescriptionSessions,
+    ResponseCache,
+    SceneChangeDetector,
+    find_previous_result,
+    store_previous_result,
+)
+
+class DeltaDescriptionSessionsTest(unittest.TestCase):
+    def setUp(self):
+        self.sessions = DeltaDescriptionSessions(max_chain=2, max_changes=2)
+        self.base = server_working.scene_detector.signature(make_frame())
+        self.small_change = server_working.scene_detector.signature(make_frame((90, 90, 40, 40)))
+        self.sessions.record("cam", self.base, "key", {"text": "A hallway with a door.", "completion_tokens": 6})
+
+    def delta(self, text):
+        self.sessions.record("cam", self.small_change, "key", {"text": text, "completion_tokens": 3, "delta": True})
+
+    def test_small_change_asks_only_for_differences(self):
+        prompt = self.sessions.prompt_for("cam", self.small_change, "key")
+        self.assertIn("A hallway with a door.", prompt)
+        self.assertIn(NO_SIGNIFICANT_CHANGE, prompt)
+
+    def test_full_description_needed(self):
+        large_change = server_working.scene_detector.signature(make_frame((30, 30, 150, 150)))
+        self.assertIsNone(self.sessions.prompt_for("cam", large_change, "key"))
+        self.assertIsNone(self.sessions.prompt_for("cam", self.small_change, "other key"))
+        self.assertIsNone(self.sessions.prompt_for("other cam", self.small_change, "key"))
+
+    def test_changes_accumulate_until_the_chain_ends(self):
+        self.delta("A person walked in.")
+        self.delta("The door opened.")
+        self.assertIsNone(self.sessions.prompt_for("cam", self.small_change, "key"))
+
+        self.sessions.max_chain = 5
+        self.delta("The person left.")
+        prompt = self.sessions.prompt_for("cam", self.small_change, "key")
+        self.assertNotIn("A person walked in.", prompt)
+        self.assertIn("The door opened. The person left.", prompt)
+        self.assertEqual(self.sessions.summary()["delta_frames"], 3)
+
+    def test_full_result_resets_the_chain(self):
+        self.delta("A person walked in.")
+        self.sessions.record("cam", self.base, "key", {"text": "An empty room.", "completion_tokens": 4})
+        prompt = self.sessions.prompt_for("cam", self.small_change, "key")
+        self.assertIn("An empty room.", prompt)
+        self.assertNotIn("A person walked in.", prompt)
+
+class StorePreviousResultTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in (
+            ("scene_detector", SceneChangeDetector()),
+            ("delta_sessions", DeltaDescriptionSessions()),
+            ("response_cache", ResponseCache()),
+        ):
+            patcher = mock.patch.object(server_working, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.frame = make_frame()
+
+    def lookup(self, session_id="cam", image_key="frame-a"):
+        return find_previous_result(session_id, self.frame, image_key, "What is in front of me?", "general", GENERATION_PARAMS)
+
+    def test_fresh_result_feeds_every_reuse_path(self):
+        _, slots = self.lookup()
+        store_previous_result(slots, {"text": "A hallway.", "completion_tokens": 2})
+        self.assertEqual(server_working.delta_sessions.summary()["full_frames"], 1)
+        self.assertTrue(self.lookup()[0]["scene_unchanged"])
+        self.assertEqual(server_working.response_cache.summary()["entries"], 1)
+
+    def test_delta_answer_is_not_replayed(self):
+        _, slots = self.lookup()
+        store_previous_result(slots, {"text": "A hallway.", "completion_tokens": 2})
+        _, slots = self.lookup()
+        store_previous_result(slots, {"text": "A person walked in.", "completion_tokens": 4, "delta": True})
+
+        replay = self.lookup()[0]
+        self.assertEqual(replay["text"], NO_SIGNIFICANT_CHANGE)
+        self.assertEqual(replay["completion_tokens"], 0)
+        self.assertEqual(server_working.response_cache.summary()["entries"], 1)
+
+    def test_replayed_results_are_not_stored_again(self):
+        _, slots = self.lookup()
+        store_previous_result(slots, {"text": "A hallway.", "completion_tokens": 2, "scene_unchanged": True})
+        self.assertEqual(server_working.delta_sessions.summary()["sessions"], 0)
+        self.assertIsNone(self.lookup()[0])
+
+    def test_cache_hit_becomes_the_scene_reference(self):
+        _, slots = self.lookup()
+        store_previous_result(slots, {"text": "A hallway.", "completion_tokens": 2, "cache_hit": True})
+        result = self.lookup()[0]
+        self.assertTrue(result["scene_unchanged"])
+        self.assertNotIn("cache_hit", result)
+        self.assertEqual(server_working.response_cache.summary()["entries"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
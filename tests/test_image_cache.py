@@ -0,0 +1,40 @@
+import unittest
+
+from helpers import make_frame
+from server_working import ImageContentCache
+
+class ImageContentCacheTest(unittest.TestCase):
+    def test_images_and_inputs_round_trip(self):
+        cache = ImageContentCache()
+        key = ImageContentCache.content_key("aGVsbG8=")
+        self.assertEqual(key, ImageContentCache.content_key(b"aGVsbG8="))
+        self.assertIsNone(cache.get_image(key))
+
+        image = make_frame()
+        cache.put_image(key, image)
+        self.assertIs(cache.get_image(key), image)
+        cache.put_inputs(key, "prompt", {"input_ids": [1, 2, 3]})
+        self.assertEqual(cache.get_inputs(key, "prompt"), {"input_ids": [1, 2, 3]})
+        self.assertIsNone(cache.get_inputs(key, "other prompt"))
+
+    def test_keeps_latest_prompts_per_image(self):
+        cache = ImageContentCache(max_prompts_per_image=2)
+        cache.put_image("frame", make_frame())
+        for prompt in ("a", "b", "c"):
+            cache.put_inputs("frame", prompt, {"prompt": prompt})
+        self.assertIsNone(cache.get_inputs("frame", "a"))
+        self.assertIsNotNone(cache.get_inputs("frame", "c"))
+
+    def test_byte_budget_evicts_least_recently_used_image(self):
+        frame_bytes = 256 * 256 * 3
+        cache = ImageContentCache(max_bytes=2 * frame_bytes)
+        for key in ("first", "second"):
+            cache.put_image(key, make_frame())
+        cache.get_image("first")
+        cache.put_image("third", make_frame())
+        self.assertIsNotNone(cache.get_image("first"))
+        self.assertIsNone(cache.get_image("second"))
+        self.assertLessEqual(cache.summary()["bytes"], 2 * frame_bytes)
+
+if __name__ == "__main__":
+    unittest.main()
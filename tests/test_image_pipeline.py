@@ -0,0 +1,49 @@
+import base64
+import io
+import unittest
+
+from PIL import Image, ImageChops, ImageStat
+
+from helpers import jpeg_bytes, make_frame
+from image_pipeline import decode_and_resize, decode_image, resize_filter_for, resize_image_for_accessibility
+
+class ResizeTest(unittest.TestCase):
+    def test_caps_longest_edge_and_keeps_aspect_ratio(self):
+        self.assertEqual(resize_image_for_accessibility(make_frame(size=(1280, 720)), 512).size, (512, 288))
+        self.assertEqual(resize_image_for_accessibility(make_frame(size=(720, 1280)), 512).size, (288, 512))
+
+    def test_small_image_is_returned_unchanged(self):
+        image = make_frame(size=(320, 240))
+        self.assertIs(resize_image_for_accessibility(image, 512), image)
+
+    def test_two_stage_matches_single_pass(self):
+        image = make_frame((1000, 800, 1500, 1200), size=(4032, 3024))
+        single = resize_image_for_accessibility(image, 512, two_stage=False)
+        two_stage = resize_image_for_accessibility(image, 512, two_stage=True)
+        self.assertEqual(single.size, two_stage.size)
+        difference = ImageStat.Stat(ImageChops.difference(single, two_stage)).mean
+        self.assertLess(max(difference), 2.0)
+
+    def test_unknown_prompt_type_uses_lanczos(self):
+        self.assertEqual(resize_filter_for("navigation"), Image.Resampling.BILINEAR)
+        self.assertEqual(resize_filter_for("unknown"), Image.Resampling.LANCZOS)
+
+class DecodeTest(unittest.TestCase):
+    def test_large_jpeg_draft_decodes_no_smaller_than_target(self):
+        image = decode_image(io.BytesIO(jpeg_bytes(make_frame(size=(4000, 3000)))), max_size=512)
+        self.assertEqual(image.mode, "RGB")
+        self.assertGreaterEqual(max(image.size), 512)
+        self.assertLess(max(image.size), 4000)
+
+    def test_small_jpeg_decodes_at_full_size(self):
+        self.assertEqual(decode_image(io.BytesIO(jpeg_bytes(make_frame(size=(640, 480)))), max_size=512).size, (640, 480))
+
+    def test_decode_and_resize_accepts_base64_bytes_and_streams(self):
+        payload = jpeg_bytes(make_frame(size=(1280, 720)))
+        for source in (base64.b64encode(payload).decode(), payload, io.BytesIO(payload)):
+            image, seconds = decode_and_resize(source, max_size=512)
+            self.assertEqual(image.size, (512, 288))
+            self.assertGreaterEqual(seconds, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from helpers import GENERATION_PARAMS
+from inference_backends import FakeBackend, OnnxDecodeState, OnnxSmolVLMBackend, select_tokens
+
+def make_request(color, prompt="Describe this image", max_new_tokens=40):
+    return SimpleNamespace(
+        image=Image.new("RGB", (64, 64), color),
+        text_prompt=prompt,
+        generation_params={**GENERATION_PARAMS, "max_new_tokens": max_new_tokens},
+        vision_params=None
+    )
+
+def run_stream(backend, req):
+    """Text pieces a stream yields and the result dict it returns"""
+    pieces = []
+    stream = backend.stream(req)
+    while True:
+        try:
+            pieces.append(next(stream))
+        except StopIteration as stop:
+            return pieces, stop.value
+
+class SelectTokensTest(unittest.TestCase):
+    def test_greedy_takes_argmax(self):
+        logits = np.array([[0.1, 2.0, -1.0], [3.0, 0.0, 1.0]])
+        tokens = select_tokens(logits, {"do_sample": False, "temperature": 0.7}, np.random.default_rng(0))
+        self.assertEqual(tokens.tolist(), [1, 0])
+
+    def test_sampling_never_picks_masked_tokens(self):
+        logits = np.array([[-1e4, 0.0, -1e4]])
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            self.assertEqual(select_tokens(logits, {"do_sample": True, "temperature": 1.0}, rng).tolist(), [1])
+
+class FakeBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeBackend(max_tokens=48)
+        self.backend.load()
+
+    def test_same_request_gives_same_answer(self):
+        first = self.backend.generate([make_request("red")])[0]
+        second = self.backend.generate([make_request("red")])[0]
+        self.assertEqual(first["text"], second["text"])
+        self.assertNotEqual(first["text"], self.backend.generate([make_request("blue")])[0]["text"])
+
+    def test_respects_token_budget(self):
+        result = self.backend.generate([make_request("green", max_new_tokens=5)])[0]
+        self.assertLessEqual(result["completion_tokens"], 5)
+        self.assertEqual(len(result["text"].split()), result["completion_tokens"])
+
+    def test_batch_matches_single_requests(self):
+        requests = [make_request("red"), make_request("blue", prompt="Read the text")]
+        batched = self.backend.generate(requests)
+        self.assertEqual([result["batch_size"] for result in batched], [2, 2])
+        for req, result in zip(requests, batched):
+            self.assertEqual(result["text"], self.backend.generate([req])[0]["text"])
+
+    def test_stream_pieces_join_to_result(self):
+        req = make_request("yellow")
+        pieces, result = run_stream(self.backend, req)
+        self.assertGreater(len(pieces), 1)
+        self.assertEqual("".join(pieces).strip(), result["text"])
+        self.assertEqual(result["text"], self.backend.generate([req])[0]["text"])
+
+    def test_reports_stage_timings(self):
+        stages = []
+        self.backend.stage_callback = lambda stage, seconds: stages.append(stage)
+        self.backend.generate([make_request("red")])
+        self.assertEqual(stages, ["preprocess", "generate"])
+
+    def test_merged_states_decode_like_separate_ones(self):
+        first = self.backend.prefill(self.backend.preprocess([make_request("red")]))
+        self.backend.decode(first, first.logits.argmax(axis=-1))
+        second = self.backend.prefill(self.backend.preprocess([make_request("blue")]))
+        merged = self.backend.merge([first, second])
+        self.backend.decode(merged, merged.logits.argmax(axis=-1))
+
+        self.backend.decode(first, first.logits.argmax(axis=-1))
+        self.backend.decode(second, second.logits.argmax(axis=-1))
+        np.testing.assert_array_equal(merged.logits, np.concatenate([first.logits, second.logits]))
+        np.testing.assert_array_equal(self.backend.select(merged, [1]).logits, second.logits)
+
+class OnnxStateTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = OnnxSmolVLMBackend("test/model")
+        self.long = OnnxDecodeState(
+            {"past_key_values.0.key": np.ones((1, 2, 5, 3))}, np.ones((1, 5), dtype=np.int64),
+            np.arange(5)[None], np.zeros((1, 7))
+        )
+        self.short = OnnxDecodeState(
+            {"past_key_values.0.key": np.full((1, 2, 3, 3), 2.0)}, np.ones((1, 3), dtype=np.int64),
+            np.arange(3)[None], np.ones((1, 7))
+        )
+
+    def test_merge_left_pads_shorter_sequences(self):
+        merged = self.backend.merge([self.long, self.short])
+        self.assertEqual(merged.attention_mask.tolist(), [[1, 1, 1, 1, 1], [0, 0, 1, 1, 1]])
+        self.assertEqual(merged.position_ids.ravel().tolist(), [4, 2])
+        self.assertEqual(merged.past_key_values["past_key_values.0.key"][1, 0, :, 0].tolist(), [0, 0, 2, 2, 2])
+
+    def test_select_drops_columns_of_retired_sequences(self):
+        selected = self.backend.select(self.backend.merge([self.long, self.short]), [1])
+        self.assertEqual(selected.attention_mask.tolist(), [[1, 1, 1]])
+        self.assertEqual(selected.past_key_values["past_key_values.0.key"].shape, (1, 2, 3, 3))
+        np.testing.assert_array_equal(selected.logits, self.short.logits)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import threading
+import unittest
+from unittest import mock
+
+from helpers import server_working, wait_for
+from server_working import ModelLoader
+
+class ModelLoaderTest(unittest.TestCase):
+    def test_moves_from_idle_through_loading_to_ready(self):
+        release = threading.Event()
+        calls = []
+        loader = ModelLoader(lambda: (calls.append(1), release.wait(2)))
+        self.assertEqual(loader.state, "idle")
+
+        loader.start()
+        loader.start()
+        self.assertEqual(loader.state, "loading")
+        self.assertFalse(loader.ready)
+
+        release.set()
+        wait_for(lambda: loader.ready)
+        self.assertEqual(calls, [1])
+        self.assertIsNotNone(loader.summary()["load_seconds"])
+
+    def test_failure_is_reported(self):
+        def fail():
+            raise RuntimeError("no weights")
+
+        loader = ModelLoader(fail)
+        loader.start()
+        wait_for(lambda: loader.state == "failed")
+        self.assertEqual(loader.summary()["error"], "no weights")
+
+class HealthTest(unittest.TestCase):
+    def use_loader(self, load_fn):
+        loader = ModelLoader(load_fn)
+        patcher = mock.patch.object(server_working, "model_loader", loader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        loader.start()
+        return loader
+
+    def test_loading_model_answers_503(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.use_loader(lambda: release.wait(5))
+        client = server_working.app.test_client()
+
+        health = client.get("/health")
+        self.assertEqual(health.status_code, 503)
+        self.assertEqual(health.get_json()["status"], "loading")
+
+        completion = client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "Hi"}]})
+        self.assertEqual(completion.status_code, 503)
+        self.assertEqual(completion.headers["Retry-After"], "5")
+
+    def test_failed_load_answers_503_with_the_error(self):
+        def fail():
+            raise RuntimeError("no weights")
+
+        loader = self.use_loader(fail)
+        wait_for(lambda: loader.state == "failed")
+        health = server_working.app.test_client().get("/health")
+        self.assertEqual(health.status_code, 503)
+        self.assertEqual(health.get_json()["model_loading"]["error"], "no weights")
+
+    def test_ready_model_answers_200(self):
+        loader = self.use_loader(lambda: None)
+        wait_for(lambda: loader.ready)
+        health = server_working.app.test_client().get("/health")
+        self.assertEqual(health.status_code, 200)
+        self.assertEqual(health.get_json()["status"], "ready")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+
+from helpers import GENERATION_PARAMS, make_frame, server_working
+from server_working import ResponseCache, find_cached_response, hamming_distance, perceptual_hash
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.key = ResponseCache.make_key("Describe", "general", GENERATION_PARAMS)
+        self.result = {"text": "A door ahead."}
+
+    def test_near_identical_frame_hits(self):
+        cache = ResponseCache(max_distance=4)
+        cache.put(0b1011, self.key, self.result)
+        self.assertEqual(cache.get(0b1010, self.key), self.result)
+        self.assertIsNone(cache.get(0b1011 ^ 0xFF, self.key))
+        self.assertEqual(cache.summary()["hits"], 1)
+
+    def test_content_keys_only_match_exactly(self):
+        cache = ResponseCache(max_distance=4)
+        cache.put("payload-a", self.key, self.result)
+        self.assertEqual(cache.get("payload-a", self.key), self.result)
+        self.assertIsNone(cache.get("payload-b", self.key))
+        self.assertIsNone(cache.get(0, self.key))
+
+    def test_other_prompt_or_settings_miss(self):
+        cache = ResponseCache()
+        cache.put(1, self.key, self.result)
+        self.assertIsNone(cache.get(1, ResponseCache.make_key("Read the text", "general", GENERATION_PARAMS)))
+        self.assertIsNone(cache.get(1, ResponseCache.make_key("Describe", "general", {**GENERATION_PARAMS, "max_new_tokens": 32})))
+
+    def test_expired_entries_are_dropped(self):
+        cache = ResponseCache(ttl_seconds=-1)
+        cache.put(1, self.key, self.result)
+        self.assertIsNone(cache.get(1, self.key))
+        self.assertEqual(cache.summary()["entries"], 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(max_distance=0, max_entries=2)
+        cache.put(1, self.key, {"text": "one"})
+        cache.put(2, self.key, {"text": "two"})
+        cache.get(1, self.key)
+        cache.put(3, self.key, {"text": "three"})
+        self.assertIsNotNone(cache.get(1, self.key))
+        self.assertIsNone(cache.get(2, self.key))
+
+    def test_perceptual_hash_tolerates_small_changes(self):
+        frame = make_frame()
+        self.assertEqual(perceptual_hash(frame), perceptual_hash(frame.copy()))
+        self.assertLessEqual(hamming_distance(perceptual_hash(frame), perceptual_hash(make_frame((10, 10, 4, 4)))), 4)
+
+class FindCachedResponseTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(server_working, "response_cache", ResponseCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.frame = make_frame()
+
+    def lookup(self, session_id, image_key, prompt_type="general", prompt="What is in front of me?"):
+        return find_cached_response(session_id, self.frame, image_key, prompt, prompt_type, GENERATION_PARAMS)
+
+    def store(self, session_id, image_key, text, prompt_type="general", prompt="What is in front of me?"):
+        _, slot = self.lookup(session_id, image_key, prompt_type, prompt)
+        server_working.store_cached_response(slot, {"text": text, "completion_tokens": 3})
+
+    def test_near_identical_frame_hits_within_session(self):
+        self.store("cam1", "frame-a", "A hallway.")
+        result, _ = self.lookup("cam1", "frame-b")
+        self.assertEqual(result["text"], "A hallway.")
+        self.assertTrue(result["cache_hit"])
+
+    def test_other_sessions_never_see_the_entry(self):
+        self.store("cam1", "frame-a", "A hallway.")
+        self.assertIsNone(self.lookup("cam2", "frame-a")[0])
+
+    def test_requests_without_session_skip_the_cache(self):
+        self.assertEqual(self.lookup(None, "frame-a"), (None, None))
+
+    def test_text_reading_and_safety_need_the_same_payload(self):
+        for prompt_type in ("text_reading", "safety"):
+            self.store("cam1", "label-a", "Price $4.99", prompt_type)
+            self.assertIsNone(self.lookup("cam1", "label-b", prompt_type)[0])
+            self.assertEqual(self.lookup("cam1", "label-a", prompt_type)[0]["text"], "Price $4.99")
+            self.assertEqual(self.lookup("cam1", None, prompt_type), (None, None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from unittest import mock
+
+from helpers import GENERATION_PARAMS, make_frame, server_working
+from server_working import SceneChangeDetector, find_unchanged_scene, store_scene_result
+
+class SceneChangeDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = SceneChangeDetector()
+        self.result = {"text": "A hallway."}
+        self.detector.update("cam", self.detector.signature(make_frame()), "key", self.result)
+
+    def check(self, frame, key="key", session_id="cam"):
+        return self.detector.check(session_id, self.detector.signature(frame), key)
+
+    def test_unchanged_scene_reuses_result(self):
+        self.assertEqual(self.check(make_frame()), self.result)
+        self.assertEqual(self.detector.summary()["frames_skipped"], 1)
+
+    def test_small_object_is_not_averaged_away(self):
+        # Covers about 9% of the frame, well under the old whole-frame mean threshold
+        self.assertIsNone(self.check(make_frame((90, 90, 77, 77))))
+
+    def test_moved_object_is_a_new_scene(self):
+        self.detector.update("cam", self.detector.signature(make_frame((10, 40, 60, 80))), "key", self.result)
+        self.assertIsNone(self.check(make_frame((130, 40, 60, 80))))
+
+    def test_other_prompt_or_session_miss(self):
+        self.assertIsNone(self.check(make_frame(), key="other key"))
+        self.assertIsNone(self.check(make_frame(), session_id="other cam"))
+
+    def test_result_expires_after_max_skip_seconds(self):
+        detector = SceneChangeDetector(max_skip_seconds=-1)
+        signature = detector.signature(make_frame())
+        detector.update("cam", signature, "key", self.result)
+        self.assertIsNone(detector.check("cam", signature, "key"))
+
+    def test_changed_fraction_grows_with_object_size(self):
+        base = self.detector.signature(make_frame())
+        small = self.detector.distance(base, self.detector.signature(make_frame((10, 10, 8, 8))))
+        large = self.detector.distance(base, self.detector.signature(make_frame((30, 30, 150, 150))))
+        self.assertLess(small[0], large[0])
+        self.assertLess(small[1], large[1])
+
+class FindUnchangedSceneTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(server_working, "scene_detector", SceneChangeDetector())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def analyze(self, prompt_type, prompt="What is around me?"):
+        result, slot = find_unchanged_scene("cam", make_frame(), prompt, prompt_type, GENERATION_PARAMS)
+        if result is None:
+            store_scene_result(slot, {"text": "A hallway.", "completion_tokens": 2})
+        return result
+
+    def test_unchanged_frame_replays_previous_answer(self):
+        self.assertIsNone(self.analyze("general"))
+        self.assertTrue(self.analyze("general")["scene_unchanged"])
+
+    def test_safety_and_navigation_always_run_the_model(self):
+        for prompt_type in ("safety", "navigation"):
+            self.assertIsNone(self.analyze(prompt_type))
+            self.assertIsNone(self.analyze(prompt_type))
+
+    def test_requests_without_session_are_not_tracked(self):
+        self.assertEqual(find_unchanged_scene(None, make_frame(), "Describe", "general", GENERATION_PARAMS), (None, None))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import threading
+import unittest
+
+from helpers import wait_for
+from server_working import SessionFrameGate
+
+class SessionFrameGateTest(unittest.TestCase):
+    def test_idle_session_enters_and_is_forgotten(self):
+        gate = SessionFrameGate()
+        self.assertTrue(gate.enter("cam"))
+        self.assertEqual(gate.active_sessions(), 1)
+        gate.leave("cam")
+        self.assertEqual(gate.active_sessions(), 0)
+
+    def test_newer_frame_supersedes_waiting_frame(self):
+        gate = SessionFrameGate()
+        results = {}
+        self.assertTrue(gate.enter("cam"))
+
+        def enter(name):
+            results[name] = gate.enter("cam")
+
+        older = threading.Thread(target=enter, args=("older",))
+        older.start()
+        wait_for(lambda: gate.sessions["cam"]["waiting"] == 1)
+        newer = threading.Thread(target=enter, args=("newer",))
+        newer.start()
+        older.join(2)
+        self.assertFalse(results["older"])
+
+        gate.leave("cam")
+        newer.join(2)
+        self.assertTrue(results["newer"])
+        gate.leave("cam")
+        self.assertEqual(gate.active_sessions(), 0)
+
+    def test_sessions_do_not_block_each_other(self):
+        gate = SessionFrameGate()
+        self.assertTrue(gate.enter("cam1"))
+        self.assertTrue(gate.enter("cam2"))
+        self.assertEqual(gate.active_sessions(), 2)
+
+if __name__ == "__main__":
+    unittest.main()
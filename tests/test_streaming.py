@@ -0,0 +1,49 @@
+import base64
+import json
+import unittest
+
+from helpers import jpeg_bytes, load_server, make_frame
+
+def chat_body(stream, box=(40, 40, 30, 30)):
+    image_url = "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes(make_frame(box))).decode("ascii")
+    return {
+        "messages": [{"role": "user", "content": [
+            {"type": "image", "image_url": {"url": image_url}},
+            {"type": "text", "text": "What is in front of me?"}
+        ]}],
+        "max_tokens": 24,
+        "stream": stream
+    }
+
+class StreamingResponseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = load_server()
+
+    def test_chunks_are_sse_framed_and_end_with_done(self):
+        response = self.client.post("/v1/chat/completions", json=chat_body(True))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/event-stream")
+
+        body = response.get_data(as_text=True)
+        self.assertTrue(body.endswith("data: [DONE]\n\n"))
+        events = body.split("\n\n")[:-1]
+        self.assertTrue(all(event.startswith("data: ") for event in events))
+
+        chunks = [json.loads(event[len("data: "):]) for event in events[:-1]]
+        self.assertTrue(all(chunk["object"] == "chat.completion.chunk" for chunk in chunks))
+        self.assertEqual(chunks[0]["choices"][0]["delta"], {"role": "assistant"})
+        self.assertEqual(chunks[-1]["choices"][0]["finish_reason"], "stop")
+        self.assertGreater(chunks[-1]["usage"]["completion_tokens"], 0)
+
+        text = "".join(chunk["choices"][0]["delta"].get("content", "") for chunk in chunks)
+        complete = self.client.post("/v1/chat/completions", json=chat_body(False)).get_json()
+        self.assertEqual(text.strip(), complete["choices"][0]["message"]["content"])
+
+    def test_false_string_returns_a_single_completion(self):
+        response = self.client.post("/v1/chat/completions", json=chat_body("false", box=(100, 20, 30, 30)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["object"], "chat.completion")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import unittest
+
+from helpers import jpeg_bytes, load_server, make_frame
+from server_working import RequestFieldError, parse_number
+
+class ParseNumberTest(unittest.TestCase):
+    def test_form_text_is_cast(self):
+        self.assertEqual(parse_number({"max_tokens": "32"}, "max_tokens", int, minimum=1), 32)
+        self.assertEqual(parse_number({"temperature": "0.5"}, "temperature", float, minimum=0), 0.5)
+
+    def test_invalid_values_name_the_field(self):
+        for value in ("lots", True, None, "nan", "inf", float("-inf"), float("inf")):
+            with self.assertRaisesRegex(RequestFieldError, "temperature"):
+                parse_number({"temperature": value}, "temperature", float, minimum=0)
+        with self.assertRaisesRegex(RequestFieldError, "max_tokens"):
+            parse_number({"max_tokens": float("inf")}, "max_tokens", int, minimum=1)
+
+    def test_minimum_is_enforced(self):
+        with self.assertRaisesRegex(RequestFieldError, "at least 1"):
+            parse_number({"max_tokens": "0"}, "max_tokens", int, minimum=1)
+
+class UploadRequestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = load_server()
+
+    def test_multipart_upload(self):
+        response = self.client.post("/v1/chat/completions", content_type="multipart/form-data", data={
+            "image": (io.BytesIO(jpeg_bytes(make_frame((20, 20, 40, 40)))), "frame.jpg"),
+            "prompt": "What is in front of me?",
+            "max_tokens": "12"
+        })
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertLessEqual(body["usage"]["completion_tokens"], 12)
+        self.assertTrue(body["choices"][0]["message"]["content"])
+
+    def test_raw_image_body_takes_options_from_query(self):
+        response = self.client.post(
+            "/v1/chat/completions?max_tokens=8&prompt=What%20is%20ahead",
+            data=jpeg_bytes(make_frame((60, 20, 40, 40))),
+            content_type="image/jpeg"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(response.get_json()["usage"]["completion_tokens"], 8)
+
+    def test_invalid_fields_are_rejected(self):
+        for query in ("max_tokens=many", "temperature=inf", "temperature=-1", "longest_edge=0"):
+            response = self.client.post(
+                f"/v1/chat/completions?{query}", data=jpeg_bytes(make_frame()), content_type="image/jpeg"
+            )
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(query.split("=")[0], response.get_json()["error"])
+
+    def test_multipart_without_image_is_rejected(self):
+        response = self.client.post("/v1/chat/completions", content_type="multipart/form-data", data={"prompt": "Hi"})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == "__main__":
+    unittest.main()